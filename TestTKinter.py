@@ -1,30 +1,29 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
+import queue
 import threading
-import pandas as pd
 import os
-import re
-import time
-import random
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
-from io import BytesIO
-import openpyxl
+
+# Light imports only: pandas, openpyxl and requests are loaded by the pipeline when a run needs them
+from edscreener.pipeline import run_screening
+from edscreener.progress import throttled_progress
 
 import logging
 
+POLL_MS = 100  # How often the main loop picks up progress from the worker thread
+
 def setup_logging(folder_path):
     log_folder = os.path.join(folder_path, "log")
     os.makedirs(log_folder, exist_ok=True)
     log_filename = f"log_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt"
     log_path = os.path.join(log_folder, log_filename)
-    logging.basicConfig(
-        filename=log_path,
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
-    return log_path
+    # One log file per run (basicConfig would keep writing to the first one), packaged with the results
+    handler = logging.FileHandler(log_path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.INFO)
+    return log_path, handler
 
 class EDScreenerApp:
     def __init__(self, root):
@@ -43,9 +42,50 @@ class EDScreenerApp:
         self.folder_label = tk.Label(root, text=f"Output folder: {self.folder_path}")
         self.folder_label.pack()
 
+        # Offline: take the source lists from an earlier results package or folder, no downloads
+        self.offline_path = None
+        tk.Button(root, text="Offline sources: package...", command=self.select_offline_package).pack()
+        tk.Button(root, text="Offline sources: folder...", command=self.select_offline_folder).pack()
+        self.offline_label = tk.Label(root, text="Sources: download")
+        self.offline_label.pack()
+
+        # ECHA CHEM lookups cost about three requests per new substance, so they are off unless asked
+        self.classification = tk.BooleanVar(value=False)
+        tk.Checkbutton(root, text="Look up C&L classifications in ECHA CHEM (slow for large lists)",
+                       variable=self.classification).pack()
+
         tk.Button(root, text="Run Screener", command=self.run_screener).pack()
         self.status_label = tk.Label(root, text="")
         self.status_label.pack()
+        self.progress_bar = ttk.Progressbar(root, length=400, maximum=1.0)
+        self.progress_bar.pack()
+        self.events_list = tk.Listbox(root, height=8, width=70)
+        self.events_list.pack()
+
+        # The worker thread never touches widgets: it queues updates, the main loop applies them
+        self.updates = queue.Queue()
+        self.root.after(POLL_MS, self.apply_updates)
+
+    def post(self, status, fraction=None, events=None):
+        self.updates.put((status, fraction, events))
+
+    def apply_updates(self):
+        latest = None
+        while True:
+            try:
+                latest = self.updates.get_nowait()
+            except queue.Empty:
+                break
+        if latest:
+            status, fraction, events = latest
+            self.status_label.config(text=status)
+            if fraction is not None:
+                self.progress_bar["value"] = fraction
+            if events is not None:
+                self.events_list.delete(0, tk.END)
+                for event in events:
+                    self.events_list.insert(tk.END, event)
+        self.root.after(POLL_MS, self.apply_updates)
 
     def select_file(self):
         self.file_path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
@@ -55,126 +95,56 @@ class EDScreenerApp:
         self.folder_path = filedialog.askdirectory()
         self.folder_label.config(text=f"Folder: {self.folder_path}")
 
+    def select_offline_package(self):
+        self.offline_path = filedialog.askopenfilename(filetypes=[("Results package", "*.zip")]) or None
+        self.offline_label.config(text=f"Sources: {self.offline_path or 'download'}")
+
+    def select_offline_folder(self):
+        self.offline_path = filedialog.askdirectory() or None
+        self.offline_label.config(text=f"Sources: {self.offline_path or 'download'}")
+
     def run_screener(self):
         if not self.file_path:
             messagebox.showerror("Error", "Please select an Excel file.")
             return
-        self.status_label.config(text="Running...")
-        threading.Thread(target=self.process_data).start()
+        self.post("Running...", 0.0, [])
+        # Tk variables are read here, in the main thread
+        threading.Thread(target=self.process_data, args=(self.classification.get(),), daemon=True).start()
 
-    def process_data(self):
+    def process_data(self, classification=False):
         # Add logging
-        log_path = setup_logging(self.folder_path)
-        logging.info("Started ED screener process")
+        log_path, log_handler = setup_logging(self.folder_path)
         logging.info(f"Selected input file: {self.file_path}")
         logging.info(f"Selected output folder: {self.folder_path}")
 
+        warnings = []
+        progress = throttled_progress(
+            lambda tracker, text: self.post(text, tracker.fraction, warnings + list(tracker.recent)))
+
+        def warn(message):
+            logging.warning(message)
+            warnings.append(message)
+
         try:
-            CASallpd = pd.read_excel(self.file_path)
-            if "CAS" not in CASallpd.columns:
-                self.status_label.config(text="Error: 'CAS' column not found.")
-                return
-
-            CASall = CASallpd["CAS"].dropna().tolist()
-            CASall = [re.sub(r'[^\d\-]', '', str(cas)) for cas in CASall]
-            N_CAS = len(CASall)
-            clp_info = [{"id": i+1, "Input": CASall[i]} for i in range(N_CAS)]
-
-            # Add empty fields
-            key_names = [
-                 "Input","CAS","EC","Name ECHA-CHEM","ECHA-CHEM checked","REACH tonnage band","On C&L?","Entries C&L","C&L URL","C&L Type","Joint Entries","Classification - Hazard classes",
-                 "Classification - Hazard statements","Classification - Organs/ExposureRoute",
-                 "Labeling - Hazard statements", "Labeling - Supplementary Hazard statements",
-                 "Labeling - Organs/ExposureRoute","Specific concentration limits","M-factors","C&L notes",
-                 "ED PPP: Yes/No","ED PPP: Status","ED PPP: Conclusion HH","ED PPP: Conclusion non-TO",
-                 "ED PPP: EFSA conclusion link",
-                 "BPR: Yes/No","BPR: ED HH","BPR: ED ENV",
-                 "ED Assessment List: Yes/No","ED Assessment List: Outcome",
-                 "ED Assessment List: Status","ED Assessment List: Authority","ED Assessment List: Last updated",
-                 "SVHC: Yes/No","SVHC: Reason","SVHC: Date Inclusion","SVHC: Decision",
-                 "Food additive: Yes/No","Food additive: E number","Food flavourings: Yes/No","Food flavourings: FL",
-                 "SVHC intent: Yes/No","SVHC intent: Status","SVHC intent: Scope","SVHC intent: Last updated",
-                 "PACT: Yes/No","PACT: SEv","PACT: SEv link","PACT: DEv","PACT: DEv link","PACT: ED","PACT: ED link",
-                 "PACT: ARN","PACT: ARN link","PACT: PBT","PACT: PBT link","PACT: CLH","PACT: CLH link","PACT: SVHC",
-                 "PACT: SVHC link",
-                 "CoRAP: Yes/No","CoRAP: Initial grounds of Concern","CoRAP: Status","CoRAP: Latest update"
-                 ]
-            for entry in clp_info:
-                for key in key_names:
-                    entry[key] = "-"
-
-            # Create databases folder
-            databases_folder = os.path.join(self.folder_path, "databases")
-            os.makedirs(databases_folder, exist_ok=True)
-            # Function to check if file is up to date (from today)
-            def file_downloaded_today(path):
-                if os.path.exists(path):
-                    mod_time = datetime.fromtimestamp(os.path.getmtime(path)).date()
-                    return mod_time == datetime.now().date()
-                return False
-            datetoday = datetime.now().strftime("%Y-%m-%d")
-
-            # Download EFSA PPP ED Excel
-            efsaPPP_url = "https://www.efsa.europa.eu/en/applications/pesticides"
-            PPP_ED_string = "overview-endocrine-disrupting-assessment-pesticide-active-substances"
-            responseEFSA = requests.get(efsaPPP_url)
-            ED_PPP = None
-
-            if responseEFSA.status_code == 200:
-                soupEFSA = BeautifulSoup(responseEFSA.text, "html.parser")
-                matching_links = [link.get("href") for link in soupEFSA.find_all("a", href=True)
-                                  if PPP_ED_string in link.get("href") and link.get("href").endswith((".xls", ".xlsx"))]
-                if matching_links:
-                    file_url = requests.compat.urljoin(efsaPPP_url, matching_links[0])
-                    ED_PPP = requests.get(file_url)
-                    # Step 0: Check if file already was downloaded today
-                    file_name = "PPP ED list " + datetoday + ".xlsx"
-                    file_path_PPP_ED = os.path.join(databases_folder, file_name)
-                    # Only download if file was not downloaded already today
-                    if file_downloaded_today(file_path_PPP_ED):
-                        logging.info("PPP ED file already downloaded today.")
-                    else:
-                        if ED_PPP.status_code == 200:  # Download to databases folder
-                            with open(file_path_PPP_ED, "wb") as file:
-                                file.write(ED_PPP.content)
-                            logging.info(f"Saved PPP ED list: {file_path_PPP_ED}")
-                        else:
-                            logging.info(f"Failed to download PPP ED file: {file_url}")
-
-            # Process each CAS
-            for i, entry in enumerate(clp_info):
-                if ED_PPP and ED_PPP.status_code == 200:
-                    excel_data = BytesIO(ED_PPP.content)
-                    workbook = openpyxl.load_workbook(excel_data)
-                    sheet = workbook.worksheets[0]
-                    found = False
-                    for row in sheet.iter_rows(min_row=1, max_row=sheet.max_row):
-                        for cell in row:
-                            val = str(cell.value).strip()
-                            if val in [entry["Input"]]:
-                                entry["ED PPP: Yes/No"] = "Yes"
-                                entry["ED PPP: Status"] = sheet[f"H{cell.row}"].value
-                                entry["ED PPP: Conclusion HH"] = sheet[f"I{cell.row}"].value
-                                entry["ED PPP: Conclusion non-TO"] = sheet[f"J{cell.row}"].value
-                                entry["ED PPP: EFSA conclusion link"] = sheet[f"N{cell.row}"].value
-                                found = True
-                                break
-                        if found:
-                            break
-                self.status_label.config(text=f"Processed {i+1}/{N_CAS}")
-                logging.info(f"Processed {i+1}/{N_CAS}")
-
-            # Save results
-            df = pd.DataFrame(clp_info)
-            now = datetime.now().strftime("%Y-%m-%d %H-%M")
-            output_file = os.path.join(self.folder_path, f"output/EDscreener_export_{now}.xlsx")
-            df.to_excel(output_file, index=False)
+            # Same screening as the Streamlit page; snapshots and parsed lists are kept in the output folder
+            output_folder = os.path.join(self.folder_path, "output")
+            os.makedirs(output_folder, exist_ok=True)
+            package_path, _ = run_screening(
+                self.file_path, output_folder, offline=self.offline_path, progress=progress, warn=warn,
+                log_path=log_path, cache_folder=os.path.join(self.folder_path, "databases", "snapshots"),
+                classification=classification)
+            now = datetime.now().strftime("%Y-%m-%d %H-%M-%S")
+            output_file = os.path.join(output_folder, f"EDscreener_export_{now}.zip")
+            os.replace(package_path, output_file)
             logging.info(f"Saved to {output_file}")
-            self.status_label.config(text="Finished")
-
+            self.post(f"Finished: {output_file}", 1.0, warnings)
 
         except Exception as e:
-            logging.info(f"Error: {str(e)}")
+            logging.exception("Screening failed")
+            self.post(f"Error: {e}")
+        finally:
+            logging.getLogger().removeHandler(log_handler)
+            log_handler.close()
 
 # Run the app
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Performance benchmarks of the screener on synthetic data (see ``benchmarks.run``)."""
@@ -0,0 +1,121 @@
+"""Local stand-in for the ECHA CHEM API, answering from recorded responses.
+
+The synthetic answers follow the layout ``edscreener.echa_chem`` assumes; they
+exercise the client, they do not confirm that the live service answers so.
+
+Answers are JSON files named by ``edscreener.echa_chem.recording_name``, as
+saved by a real run with ``EDSCREENER_ECHA_CHEM_RECORD_DIR`` set or written by
+``write_recordings`` for synthetic substances. A search without a recording
+gets an empty result (a substance ECHA CHEM does not know), any other request
+without one a 404. ``latency`` adds a fixed delay to every request and
+``fail_every`` answers every n-th request with a 503, to exercise the retries.
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+from edscreener import echa_chem
+
+HAZARDS = [
+    ("Carc. 1B", "H350", None, None),
+    ("Repr. 1B", "H360FD", None, None),
+    ("STOT RE 2", "H373", "liver", "oral"),
+    ("Acute Tox. 4", "H302", None, None),
+    ("Skin Irrit. 2", "H315", None, None),
+]
+TONNAGE_BANDS = ["1 - 10 tonnes per annum", "100 - 1000 tonnes per annum", "1000 - 10000 tonnes per annum"]
+
+
+def write_recordings(folder, identifiers):
+    """Recorded answers for synthetic substances: (CAS, EC) pairs, the n-th one with rmlId 100.000.n."""
+    os.makedirs(folder, exist_ok=True)
+
+    def save(path, params, data):
+        with open(os.path.join(folder, echa_chem.recording_name(path, params)), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    for n, (cas, ec) in enumerate(identifiers):
+        rml_id = f"100.{n // 1000:03d}.{n % 1000:03d}"
+        substance = {"substanceIndex": {"rmlId": rml_id, "rmlName": f"Substance {n}", "rmlCas": cas, "rmlEc": ec}}
+        for identifier in filter(None, (cas, ec)):
+            save(echa_chem.SEARCH_PATH, {"searchText": identifier, "pageIndex": 1, "pageSize": 100},
+                 {"items": [substance], "state": {"totalItems": 1}})
+        if n % 4:  # Every fourth substance has no C&L entry
+            hazards = [HAZARDS[(n + i) % len(HAZARDS)] for i in range(1 + n % 3)]
+            save(echa_chem.CLASSIFICATION_PATH.format(rml_id=rml_id), None, {
+                "harmonised": n % 2 == 1, "numberOfNotifications": n % 40 + 1, "jointEntries": n % 3 == 0,
+                "classifications": [{"hazardClassCategory": category, "hazardStatement": statement,
+                                     "organs": organs, "exposureRoute": route}
+                                    for category, statement, organs, route in hazards],
+                "labelling": {"hazardStatements": [statement for _, statement, _, _ in hazards],
+                              "supplementaryHazardStatements": ["EUH208"] if n % 5 == 0 else [],
+                              "organs": [organs for _, _, organs, _ in hazards if organs]},
+                "specificConcentrationLimits": ["C >= 25 %: Skin Irrit. 2"] if n % 6 == 0 else [],
+                "mFactors": [], "notes": ["Note B"] if n % 7 == 0 else []})
+        save(echa_chem.DOSSIER_PATH, {"rmlId": rml_id, "registrationStatuses": "Active", "pageIndex": 1,
+                                      "pageSize": 100},
+             {"items": [{"reachDossierInfo": {"tonnageBand": TONNAGE_BANDS[n % len(TONNAGE_BANDS)]}}]})
+
+
+class ChemPortal:
+    def __init__(self, recordings, latency=0.0, fail_every=0):
+        self.recordings = recordings  # Folder of recorded answers
+        self.latency = latency
+        self.fail_every = fail_every
+        self.requests = []  # (path, status) of every request served
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = None
+        self._patched = None
+
+    def _handler(self):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b""):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with portal._lock:
+                    portal.requests.append((urlparse(self.path).path, status))
+
+            def do_GET(self):
+                time.sleep(portal.latency)
+                with portal._lock:
+                    count = len(portal.requests) + 1
+                if portal.fail_every and count % portal.fail_every == 0:
+                    self._send(503)
+                    return
+                url = urlparse(self.path)
+                path = os.path.join(portal.recordings, echa_chem.recording_name(url.path, dict(parse_qsl(url.query))))
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        self._send(200, f.read())
+                elif url.path == echa_chem.SEARCH_PATH:
+                    self._send(200, b'{"items": [], "state": {"totalItems": 0}}')
+                else:
+                    self._send(404, b'{"error": "Not found"}')
+
+        return Handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        # Point the ECHA CHEM client at the stand-in
+        self._patched = echa_chem.ECHA_CHEM_URL
+        echa_chem.ECHA_CHEM_URL = self.base_url
+        return self
+
+    def __exit__(self, *exc):
+        echa_chem.ECHA_CHEM_URL = self._patched
+        self.server.shutdown()
+        self.server.server_close()
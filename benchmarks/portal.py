@@ -0,0 +1,102 @@
+"""Local stand-in for the EFSA and ECHA portals.
+
+Serves the pages and exports the downloaders talk to:
+
+* the EFSA pesticides page, linking to the PPP ED overview workbook,
+* the ECHA list pages with their "… of N results" count,
+* the ``exportResults`` POST of the disslists/disspact portlets.
+
+Workbooks are answered with an ETag, and a matching If-None-Match gets a 304,
+so snapshot revalidation can be measured as well. ``latency`` adds a fixed
+delay to every request to mimic a slow portal.
+"""
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from edscreener import downloads
+
+EFSA_PAGE = "/en/applications/pesticides"
+EFSA_FILE = f"/files/{downloads.PPP_ED_STRING}.xlsx"
+
+
+class Portal:
+    def __init__(self, files, rows, latency=0.0):
+        self.files = files  # Source name -> workbook path
+        self.rows = rows
+        self.latency = latency
+        self.paths = {urlparse(url).path: source for source, url in downloads.ECHA_URLS.items()}
+        self.requests = []  # (method, path, status) of every request served
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = None
+        self._patched = {}
+
+    def _handler(self):
+        portal = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="text/html", headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+                portal.requests.append((self.command, urlparse(self.path).path, status))
+
+            def _send_workbook(self, source):
+                with open(portal.files[source], "rb") as f:
+                    content = f.read()
+                etag = f'"{hashlib.sha256(content).hexdigest()[:16]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._send(304, headers={"ETag": etag})
+                else:
+                    self._send(200, content, "application/vnd.ms-excel", {"ETag": etag})
+
+            def do_GET(self):
+                time.sleep(portal.latency)
+                path = urlparse(self.path).path
+                if path == EFSA_PAGE:
+                    self._send(200, f'<html><a href="{EFSA_FILE}">ED overview</a></html>'.encode())
+                elif path == EFSA_FILE:
+                    self._send_workbook("PPP")
+                elif path in portal.paths:
+                    count = f"{portal.rows:,}"
+                    self._send(200, f'<small class="search-results">1 - 50 of {count} results</small>'.encode())
+                else:
+                    self._send(404)
+
+            def do_POST(self):
+                time.sleep(portal.latency)
+                url = urlparse(self.path)
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if url.path in portal.paths and parse_qs(url.query).get("p_p_resource_id") == ["exportResults"]:
+                    self._send_workbook(portal.paths[url.path])
+                else:
+                    self._send(404)
+
+        return Handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        # Point the downloaders at the stand-in
+        self._patched = {"EFSA_PPP_URL": downloads.EFSA_PPP_URL, "ECHA_URLS": dict(downloads.ECHA_URLS)}
+        downloads.EFSA_PPP_URL = self.base_url + EFSA_PAGE
+        for source, url in self._patched["ECHA_URLS"].items():
+            downloads.ECHA_URLS[source] = self.base_url + urlparse(url).path
+        return self
+
+    def __exit__(self, *exc):
+        downloads.EFSA_PPP_URL = self._patched["EFSA_PPP_URL"]
+        downloads.ECHA_URLS.update(self._patched["ECHA_URLS"])
+        self.server.shutdown()
+        self.server.server_close()
+
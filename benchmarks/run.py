@@ -0,0 +1,159 @@
+"""Benchmark of the screening pipeline against synthetic sources and a local portal.
+
+    python -m benchmarks.run --rows 1000 20000 200000 --inputs 10000 --duplicates 0.3
+
+For every source size the synthetic lists are generated (once, kept in the
+work folder), served by the portal stand-in and run through the same stages
+as a real screening: download, revalidation, parsing, cached parsing, building
+the CAS/EC crosswalk, reading the input, screening, the ECHA CHEM C&L lookup of
+``--classify`` substances (against the recorded-answer stand-in, first with an
+empty cache, then from the cache), writing the results workbook and packaging. Wall time
+and peak RSS are reported per stage; ``--json`` writes them to a file for
+comparison between versions.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.chem_portal import ChemPortal, write_recordings
+from benchmarks.portal import Portal
+from benchmarks.synthetic import input_values, write_input, write_sources
+from edscreener.crosswalk import Crosswalk
+from edscreener.downloads import content_size, download_sources
+from edscreener.echa_chem import ClassificationCache, enrich_records
+from edscreener.export import write_results_workbook
+from edscreener.metrics import peak_rss, reset_peak_rss
+from edscreener.package import write_package
+from edscreener.parsed_cache import ParsedCache
+from edscreener.screening import load_indexes, new_records, read_input, screen_records
+from edscreener.snapshots import SnapshotCache
+
+UPLOADED = ("BPR", "food_add", "food_flav")
+
+
+class Stages:
+    def __init__(self):
+        self.results = []
+
+    @contextmanager
+    def measure(self, stage, **details):
+        reset_peak_rss()
+        started = time.perf_counter()
+        yield details
+        self.results.append({"stage": stage, "seconds": round(time.perf_counter() - started, 3),
+                             "peak_rss_mb": round(peak_rss() / 1e6, 1), **details})
+
+
+def run_size(rows, args, work_folder):
+    stages = Stages()
+    source_paths = write_sources(os.path.join(work_folder, "sources"), rows, args.seed)
+    input_path = os.path.join(work_folder, f"input_{args.inputs}_{rows}_{args.seed}.xlsx")
+    write_input(input_path, input_values(args.inputs, rows, args.duplicates, args.hit_rate, args.seed))
+
+    with tempfile.TemporaryDirectory() as run_folder, Portal(source_paths, rows, args.latency) as portal:
+        snapshot_folder = os.path.join(run_folder, "snapshots")
+        with stages.measure("download") as details:
+            downloaded = download_sources(SnapshotCache(snapshot_folder, ttl=0))
+            details["bytes"] = sum(content_size(content) for content in downloaded.values() if content)
+        with stages.measure("revalidate"):
+            download_sources(SnapshotCache(snapshot_folder, ttl=0))
+        failed = [status for _, _, status in portal.requests if status >= 400]
+        if failed:
+            logging.warning(f"Portal stand-in answered {len(failed)} requests with an error")
+
+    source_files = dict(downloaded, **{name: source_paths[name] for name in UPLOADED})
+    with stages.measure("parse") as details:
+        indexes = load_indexes(source_files)
+        details["rows"] = sum(len(index) for index in indexes.values())
+    with tempfile.TemporaryDirectory() as cache_folder:
+        parsed_cache = ParsedCache(cache_folder)
+        load_indexes(source_files, parsed_cache)  # Fill the cache
+        with stages.measure("parse_cached"):
+            load_indexes(source_files, parsed_cache)
+
+    with stages.measure("crosswalk") as details:
+        crosswalk = Crosswalk(indexes)
+        details["rows"] = len(crosswalk)
+    with stages.measure("read_input") as details:
+        raw_values = read_input(input_path)
+        details["rows"] = len(raw_values)
+    with stages.measure("screen") as details:
+        clp_info = screen_records(new_records(raw_values), indexes, crosswalk=crosswalk)
+        details["hits"] = sum(any(entry[spec] == "Yes" for spec in ("SVHC: Yes/No", "PACT: Yes/No"))
+                              for entry in clp_info)
+    if args.classify:
+        classified = clp_info[:args.classify]
+        with tempfile.TemporaryDirectory() as chem_folder:
+            recordings = os.path.join(chem_folder, "recordings")
+            write_recordings(recordings, [(entry["CAS"], None) for entry in classified])
+            with ChemPortal(recordings, args.latency) as chem_portal:
+                cache = ClassificationCache(os.path.join(chem_folder, "cache"))
+                with stages.measure("classify") as details:
+                    details.update(enrich_records(classified, cache, rate=args.clp_rate))
+                    details["requests"] = len(chem_portal.requests)
+                with stages.measure("classify_cached") as details:
+                    details.update(enrich_records(classified, cache, rate=args.clp_rate))
+    with tempfile.TemporaryDirectory() as output_folder:
+        results_path = os.path.join(output_folder, "EDscreener_results.xlsx")
+        with stages.measure("write_results") as details:
+            write_results_workbook(clp_info, results_path, args.summary)
+            details["bytes"] = os.path.getsize(results_path)
+        with stages.measure("package") as details:
+            package_path = os.path.join(output_folder, "package.zip")
+            write_package(package_path, [("EDscreener_results.xlsx", Path(results_path))] +
+                          [(f"databases/{name}.xlsx", content) for name, content in downloaded.items()])
+            details["bytes"] = os.path.getsize(package_path)
+    return stages.results
+
+
+def print_table(report):
+    print(f"{'rows':>8} {'stage':<14} {'seconds':>9} {'peak MB':>9}  details")
+    for size in report["sizes"]:
+        for result in size["stages"]:
+            details = ", ".join(f"{key}={value}" for key, value in result.items()
+                                if key not in ("stage", "seconds", "peak_rss_mb"))
+            print(f"{size['rows']:>8} {result['stage']:<14} {result['seconds']:>9.3f} "
+                  f"{result['peak_rss_mb']:>9.1f}  {details}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks.run", description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000],
+                        help="rows per synthetic source list (e.g. 1000 20000 200000)")
+    parser.add_argument("--inputs", type=int, default=5000, help="size of the input CAS list")
+    parser.add_argument("--duplicates", type=float, default=0.2, help="share of repeated input values")
+    parser.add_argument("--hit-rate", type=float, default=0.5, help="share of unique inputs found on the lists")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every portal request")
+    parser.add_argument("--summary", choices=("values", "formulas"), default="values")
+    parser.add_argument("--classify", type=int, default=200,
+                        help="records looked up in the ECHA CHEM stand-in (0: skip the C&L stages)")
+    parser.add_argument("--clp-rate", type=float, default=0,
+                        help="ECHA CHEM requests per second during the C&L stages (0: no limit)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work", default=os.path.join("output", "benchmark"),
+                        help="folder for the generated workbooks (reused between runs)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    report = {"started": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+              "settings": {key: value for key, value in vars(args).items() if key not in ("work", "json")},
+              "sizes": []}
+    for rows in args.rows:
+        report["sizes"].append({"rows": rows, "stages": run_size(rows, args, args.work)})
+    print_table(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,134 @@
+"""Startup benchmark of the front ends: import time, first Tk window and first Streamlit render.
+
+    python -m benchmarks.startup --repeat 5 --json output/benchmark/startup.json
+
+Every measurement runs in a fresh interpreter, so nothing is imported yet. For
+each module the import time is reported together with the heavy libraries
+(pandas, openpyxl, requests, ...) it pulled in; the screening modules are meant
+to load those only when a stage needs them. The Tk measurement creates the
+window and draws it once (skipped without a display), the Streamlit one runs
+the page once through ``streamlit.testing``. The median of ``--repeat`` runs is
+reported.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "requests", "bs4", "pyarrow")
+MODULES = ("edscreener.pipeline", "edscreener.jobs", "edscreener.cli", "edscreener.service")
+
+IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+TK_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import tkinter as tk
+import TestTKinter
+imported = time.perf_counter()
+root = tk.Tk()
+TestTKinter.EDScreenerApp(root)
+root.update()
+shown = time.perf_counter()
+root.destroy()
+print(json.dumps({"import_seconds": imported - started, "seconds": shown - started}))
+"""
+
+STREAMLIT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+app = AppTest.from_file("TestStreamlit.py", default_timeout=120).run()
+rendered = time.perf_counter()
+print(json.dumps({"streamlit_import_seconds": imported - started, "seconds": rendered - imported,
+                  "exceptions": len(app.exception)}))
+"""
+
+
+def run_script(script, env=None):
+    """Run ``script`` in a fresh interpreter from the repository root; its last output line as JSON, or None."""
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": ROOT, **(env or {})})
+    if result.returncode != 0:
+        logging.warning(f"Startup measurement failed: {result.stderr.strip().splitlines()[-1:]}")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_run(script, repeat, env=None):
+    runs = [run_script(script, env) for _ in range(repeat)]
+    if any(run is None for run in runs):
+        return None
+    result = dict(runs[0])
+    for key, value in runs[0].items():
+        if isinstance(value, float):
+            result[key] = round(statistics.median(run[key] for run in runs), 3)
+    return result
+
+
+def print_table(report):
+    print(f"{'measurement':<28}{'seconds':>9}  notes")
+    for name, result in report["results"].items():
+        if result is None:
+            print(f"{name:<28}{'-':>9}  not available (see the log)")
+            continue
+        notes = ""
+        if "heavy" in result:
+            notes = f"loads {', '.join(result['heavy'])}" if result["heavy"] else "no heavy imports"
+        elif "import_seconds" in result:
+            notes = f"of which imports {result['import_seconds']:.3f} s"
+        elif "streamlit_import_seconds" in result:
+            notes = f"plus {result['streamlit_import_seconds']:.3f} s importing streamlit"
+        print(f"{name:<28}{result['seconds']:>9.3f}  {notes}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks.startup", description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (the median is reported)")
+    parser.add_argument("--skip-tk", action="store_true", help="do not open the Tk window")
+    parser.add_argument("--skip-streamlit", action="store_true", help="do not render the Streamlit page")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    results = {}
+    for module in MODULES:
+        results[f"import {module}"] = median_run(IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES),
+                                                 args.repeat)
+    if not args.skip_tk:
+        if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+            logging.warning("No display, Tk window skipped")
+            results["Tk first window"] = None
+        else:
+            results["Tk first window"] = median_run(TK_SCRIPT, args.repeat)
+    if not args.skip_streamlit:
+        # The page starts the job runner; keep its job store out of the real one
+        with tempfile.TemporaryDirectory() as jobs_folder:
+            results["Streamlit first render"] = median_run(STREAMLIT_SCRIPT, args.repeat,
+                                                           env={"EDSCREENER_JOBS_DIR": jobs_folder})
+
+    report = {"started": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+              "repeat": args.repeat, "results": results}
+    print_table(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
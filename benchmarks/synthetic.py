@@ -0,0 +1,116 @@
+"""Synthetic source lists and input CAS lists for benchmarking.
+
+The workbooks have the sheet names and header texts the screener looks for
+(see ``edscreener.sources.SOURCES``), with valid CAS and EC numbers, so they
+exercise the same parsing and matching paths as the real ECHA/EFSA exports.
+Everything is derived from a seed, so a given size always gives the same files.
+"""
+import os
+import random
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+from edscreener.files import atomic_path
+from edscreener.sources import SOURCES
+
+# Title rows above the header, as in the ECHA exports
+TITLE_ROWS = 2
+
+
+def cas_number(n):
+    """The n-th synthetic CAS number, with a valid check digit."""
+    body = str(50000 + n * 7)
+    digits = body[::-1]
+    check = sum((i + 1) * int(d) for i, d in enumerate(digits)) % 10
+    return f"{body[:-2]}-{body[-2:]}-{check}"
+
+
+def ec_number(n):
+    """The n-th synthetic EC number (n < 400000), with a valid check digit."""
+    body = 200000 + 2 * n
+    check = sum((i + 1) * int(d) for i, d in enumerate(str(body))) % 11
+    if check == 10:  # No valid EC number, use the odd neighbour instead
+        body += 1
+        check = sum((i + 1) * int(d) for i, d in enumerate(str(body))) % 11
+    body = str(body)
+    return f"{body[:3]}-{body[3:]}-{check}"
+
+
+def source_layout(spec):
+    """Header row of a synthetic workbook for a source, and the field each column is filled from."""
+    headers = ["Substance name", "EC number", "CAS number"]
+    fields = [None, None, None]
+    seen = set()
+    for column, source_column in spec.fields.items():
+        if source_column.headers in seen:
+            continue
+        seen.add(source_column.headers)
+        headers.append(source_column.headers[0].capitalize())
+        fields.append(column)
+        # Link columns sit right next to their header
+        for link_column, link_source in spec.fields.items():
+            if link_source.headers == source_column.headers and link_source.offset == 1:
+                headers.append(None)
+                fields.append(link_column)
+    return headers, fields
+
+
+def _value(field, row, rng):
+    if field.endswith("link"):
+        return f"https://example.org/{row}"
+    if "updated" in field.lower() or "date" in field.lower():
+        return datetime(2020, 1, 1) + timedelta(days=rng.randrange(2000))
+    if field == "Food flavourings: FL":
+        return f"{row // 1000:02d}.{row % 1000:03d}"
+    return f"{field.split(': ')[-1]} {rng.randrange(50)}"
+
+
+def write_source(spec, rows, path, seed=0):
+    """Write a synthetic workbook for one source with ``rows`` substances (CAS numbers 0..rows-1)."""
+    rng = random.Random(f"{seed}-{spec.name}")
+    headers, fields = source_layout(spec)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(spec.sheet or "Export")
+    if not spec.sheet:
+        for _ in range(TITLE_ROWS):
+            ws.append([f"Synthetic {spec.label} list"])
+    ws.append(headers)
+    for row in range(rows):
+        values = [f"Substance {row}", ec_number(row), cas_number(row)]
+        values += [_value(field, row, rng) for field in fields[3:]]
+        ws.append(values)
+    wb.save(path)
+
+
+def write_sources(folder, rows, seed=0):
+    """Write (or reuse) the synthetic workbooks of all sources. Returns source name -> path."""
+    os.makedirs(folder, exist_ok=True)
+    paths = {}
+    for spec in SOURCES:
+        path = os.path.join(folder, f"{spec.name}_{rows}_{seed}.xlsx")
+        if not os.path.exists(path):
+            with atomic_path(path) as tmp_path:
+                write_source(spec, rows, tmp_path, seed)
+        paths[spec.name] = path
+    return paths
+
+
+def input_values(size, source_rows, duplicate_rate=0.2, hit_rate=0.5, seed=0):
+    """Input CAS list: ``hit_rate`` of the unique values are on the lists, ``duplicate_rate`` of all values repeat."""
+    rng = random.Random(seed)
+    unique_count = max(1, round(size * (1 - duplicate_rate)))
+    unique = [cas_number(rng.randrange(source_rows)) if rng.random() < hit_rate
+              else cas_number(source_rows + 10 * n) for n in range(unique_count)]
+    values = unique + [rng.choice(unique) for _ in range(size - unique_count)]
+    rng.shuffle(values)
+    return values
+
+
+def write_input(path, values):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(["CAS"])
+    for value in values:
+        ws.append([value])
+    wb.save(path)
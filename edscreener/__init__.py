@@ -0,0 +1 @@
+"""Shared building blocks for the ED screener front ends (Streamlit and Tkinter)."""
@@ -0,0 +1,5 @@
+import sys
+
+from edscreener.cli import main
+
+sys.exit(main())
@@ -0,0 +1,262 @@
+"""Headless batch screening for large CAS lists.
+
+    python -m edscreener inventory.xlsx --output results/ --bpr BPR.xlsx \
+        --food-additives food_add.xlsx --food-flavourings food_flav.xlsx
+
+The input (xlsx or csv with a "CAS" column) is read and screened in chunks.
+After each chunk its results and a checkpoint are written to the work folder
+inside the output folder. Running the same command again after a crash skips
+the chunks that were already finished, as long as the input, the screening
+options and the source lists are the same. The source lists are downloaded and
+indexed once and reused for every chunk.
+
+With ``--previous`` (an earlier output folder or results package) only the
+rows touched by source changes since that run are screened again.
+
+Inputs without a "CAS" column are screened by substance name when they
+have a name column (see ``names``).
+
+With ``--classification`` the C&L columns are filled from ECHA CHEM through a
+per-substance cache (see ``echa_chem``). That costs about three requests per
+uncached substance at ``EDSCREENER_CLP_RATE`` requests per second (5 by
+default), some 33 hours for 200,000 new substances, so it is off unless asked.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+from itertools import islice
+
+from edscreener.crosswalk import Crosswalk
+from edscreener.downloads import download_sources
+from edscreener.echa_chem import ClassificationCache, enrich_records
+from edscreener.export import SUMMARY_MODES, write_results_workbook
+from edscreener.files import atomic_path
+from edscreener.incremental import DIGESTS_NAME, load_previous, rescreen_records, source_digests
+from edscreener.metrics import METRICS_NAME, RunMetrics
+from edscreener.names import NameIndex, name_column, name_records
+from edscreener.offline import load_offline_sources
+from edscreener.parsed_cache import ParsedCache
+from edscreener.screening import load_indexes, new_records, screen_records
+from edscreener.snapshots import DEFAULT_TTL, SnapshotCache
+from edscreener.sources import HIT_MODES
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def input_column(path):
+    """The "CAS" column of the input, else its substance name column."""
+    import openpyxl
+    import pandas as pd
+
+    if path.lower().endswith(".csv"):
+        header = list(pd.read_csv(path, nrows=0).columns)
+    else:
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            header = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+    if "CAS" in header:
+        return "CAS"
+    column = name_column(header)
+    if column is None:
+        raise ValueError("'CAS' column (or a substance name column) not found.")
+    return column
+
+
+def iter_input(path, column="CAS"):
+    """Yield the raw values of the input column without loading the whole file."""
+    import openpyxl
+    import pandas as pd
+
+    if path.lower().endswith(".csv"):
+        for frame in pd.read_csv(path, usecols=[column], dtype=str, chunksize=DEFAULT_CHUNK_SIZE):
+            yield from frame[column].dropna()
+        return
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        if column not in header:
+            raise ValueError(f"'{column}' column not found.")
+        position = header.index(column)
+        for values in rows:
+            if position < len(values) and values[position] is not None:
+                yield values[position]
+    finally:
+        workbook.close()
+
+
+def iter_chunks(values, size):
+    iterator = iter(values)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Checkpoint:
+    """Progress of a batch run, stored as JSON next to the per-chunk results."""
+
+    def __init__(self, work_folder, input_path, chunk_size, previous=None, options=None, sources=None):
+        """``options`` are the screening options and ``sources`` a digest of the loaded lists."""
+        self.path = os.path.join(work_folder, "checkpoint.json")
+        self.work_folder = work_folder
+        stat = os.stat(input_path)
+        # A different input file, chunk size, option or source list cannot reuse earlier chunks
+        self.identity = {"input": os.path.abspath(input_path), "size": stat.st_size,
+                         "mtime": stat.st_mtime, "chunk_size": chunk_size,
+                         "previous": os.path.abspath(previous) if previous else None,
+                         "options": options or {}, "sources": sources}
+        self.completed = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("identity") == self.identity:
+                self.completed = saved["completed"]
+            else:
+                logging.info("Checkpoint belongs to another input, options or source lists, starting over")
+
+    def chunk_path(self, number):
+        return os.path.join(self.work_folder, f"chunk_{number:05d}.pkl")
+
+    def is_done(self, number):
+        return number in self.completed and os.path.exists(self.chunk_path(number))
+
+    def mark_done(self, number):
+        self.completed.append(number)
+        with atomic_path(self.path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"identity": self.identity, "completed": self.completed,
+                       "updated": datetime.now().isoformat(timespec="seconds")}, f, indent=2)
+
+
+def sources_digest(digests):
+    """One hash over the source digests (see ``incremental.source_digests``) of the loaded lists."""
+    return hashlib.sha256(json.dumps(digests, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_sources(args, metrics=None):
+    """Indexes of all source lists and the manifest describing where they came from."""
+    if args.offline:
+        # No network: the lists of an earlier package or snapshot folder
+        source_files, manifest = load_offline_sources(args.offline)
+    else:
+        snapshot_cache = SnapshotCache(ttl=args.ttl_hours * 3600)
+        source_files = download_sources(snapshot_cache, metrics=metrics)
+        manifest = snapshot_cache.manifest()
+    uploads = {"BPR": args.bpr, "food_add": args.food_additives, "food_flav": args.food_flavourings}
+    source_files.update({source: path for source, path in uploads.items() if path})
+    return load_indexes(source_files, ParsedCache(), metrics), manifest
+
+
+def run(args):
+    import pandas as pd
+
+    os.makedirs(args.output, exist_ok=True)
+    work_folder = os.path.join(args.output, "work")
+    os.makedirs(work_folder, exist_ok=True)
+
+    metrics = RunMetrics()
+    indexes, manifest = load_sources(args, metrics)
+    digests = source_digests(indexes)
+    checkpoint = Checkpoint(work_folder, args.input, args.chunk_size, args.previous,
+                            options={"hits": args.hits, "classification": args.classification,
+                                     "offline": os.path.abspath(args.offline) if args.offline else None},
+                            sources=sources_digest(digests))
+    previous = load_previous(args.previous) if args.previous else None
+    column = input_column(args.input)
+    name_index = None
+    if column != "CAS":
+        logging.info(f"No 'CAS' column, screening by the names in '{column}'")
+        with metrics.stage("name_index") as details:
+            name_index = NameIndex(indexes)
+            details["names"] = len(name_index)
+    with metrics.stage("crosswalk") as details:
+        crosswalk = Crosswalk(indexes)
+        details["rows"] = len(crosswalk)
+    classification_cache = ClassificationCache() if args.classification else None
+
+    next_id = 1
+    chunk_numbers = []
+    screened = {}  # Unique inputs already screened, shared by all chunks
+    for number, raw_chunk in enumerate(iter_chunks(iter_input(args.input, column), args.chunk_size)):
+        chunk_numbers.append(number)
+        if checkpoint.is_done(number):
+            logging.info(f"Chunk {number} already done, skipping")
+        else:
+            if name_index:
+                with metrics.stage("name_match", rows=len(raw_chunk)):
+                    clp_info = name_records(raw_chunk, name_index, first_id=next_id)
+            else:
+                clp_info = new_records(raw_chunk, first_id=next_id)
+            if previous:
+                rescreen_records(clp_info, indexes, previous, screened, metrics=metrics, hits=args.hits,
+                                 crosswalk=crosswalk)
+            else:
+                screen_records(clp_info, indexes, screened, metrics=metrics, hits=args.hits, crosswalk=crosswalk)
+            if classification_cache:
+                enrich_records(clp_info, classification_cache, fetch=not args.offline, metrics=metrics)
+            with atomic_path(checkpoint.chunk_path(number)) as tmp_path:
+                pd.DataFrame(clp_info).to_pickle(tmp_path)
+            checkpoint.mark_done(number)
+            logging.info(f"Chunk {number} done: rows {next_id}-{next_id + len(raw_chunk) - 1}")
+        next_id += len(raw_chunk)
+
+    # Merge the chunk results into one workbook
+    df = pd.concat([pd.read_pickle(checkpoint.chunk_path(number)) for number in chunk_numbers], ignore_index=True)
+    results_path = os.path.join(args.output, "EDscreener_results.xlsx")
+    with metrics.stage("write_results", rows=len(df)):
+        write_results_workbook(df.to_dict("records"), results_path, args.summary)
+    with open(os.path.join(args.output, "snapshots.json"), "w", encoding="utf-8") as f:
+        f.write(manifest)
+    with open(os.path.join(args.output, DIGESTS_NAME), "w", encoding="utf-8") as f:
+        json.dump(digests, f)
+    with open(os.path.join(args.output, METRICS_NAME), "w", encoding="utf-8") as f:
+        f.write(metrics.to_json())
+    logging.info(f"Saved {len(df)} results to {results_path}")
+    return results_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="edscreener", description="Screen a CAS list against the ED source lists.")
+    parser.add_argument("input", help="xlsx or csv file with a 'CAS' column (or a substance name column)")
+    parser.add_argument("--output", default="output", help="folder for results, log and checkpoints")
+    parser.add_argument("--bpr", help="BPR ED workbook")
+    parser.add_argument("--food-additives", help="food additives workbook")
+    parser.add_argument("--food-flavourings", help="food flavourings workbook")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--offline", help="results package (zip) or folder whose source lists are used "
+                                          "instead of downloading")
+    parser.add_argument("--hits", choices=HIT_MODES, default="first",
+                        help="substances listed several times: report the first row, all rows joined, "
+                             "or all rows on an extra 'All hits' sheet")
+    parser.add_argument("--summary", choices=SUMMARY_MODES, default="values",
+                        help="fill the Summary sheet with computed values or with Excel formulas")
+    parser.add_argument("--previous", help="output folder or results package of an earlier run to rescreen incrementally")
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL / 3600,
+                        help="reuse downloaded source lists for this many hours")
+    parser.add_argument("--classification", action="store_true",
+                        help="look up C&L classifications in ECHA CHEM; about 3 requests per uncached substance "
+                             "at EDSCREENER_CLP_RATE (5) per second, i.e. hours for large inventories")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    log_path = os.path.join(args.output, f"log_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=[logging.FileHandler(log_path), logging.StreamHandler()])
+    try:
+        run(args)
+    except ValueError as e:
+        logging.error(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""CAS <-> EC crosswalk harvested from the loaded source lists.
+
+Some lists record a substance only by its EC number (UVCBs in CoRAP and PACT),
+others only by its CAS number, so a CAS input used to miss the EC-only rows and
+the other way round. Most lists name both numbers in the same row, though. The
+``Crosswalk`` collects those pairs from every loaded list when the sources are
+indexed; screening then matches each input on its own number and on the
+partner numbers the lists give for it.
+
+A row is only used when it names one CAS or one EC number: a group entry with
+several of both cannot say which numbers belong together. A number that the
+lists pair with more than one partner (one CAS with two EC numbers, ...) is
+matched on all of them and reported as a conflict in the "Identifier
+crosswalk" column.
+"""
+import logging
+
+from edscreener.identifiers import VALID_CAS, VALID_EC, normalise
+from edscreener.sources import SOURCES
+
+SEPARATOR = "; "
+
+
+class Crosswalk:
+    def __init__(self, indexes):
+        """Pairs from every row of the loaded indexes (source name -> SourceIndex)."""
+        self.partners = {}  # CAS/EC number -> {partner number: [labels of the lists pairing them]}
+        checks = {}  # Identifier token -> (canonical number, check), each token normalised once
+        for spec in SOURCES:
+            index = indexes.get(spec.name)
+            if index is None:
+                continue
+            for row_identifiers in index.identifiers:
+                cas, ec = [], []
+                for token in row_identifiers:
+                    value, check = checks.get(token) or checks.setdefault(token, normalise(token))
+                    if check == VALID_CAS:
+                        cas.append(value)
+                    elif check == VALID_EC:
+                        ec.append(value)
+                if not cas or not ec or (len(cas) > 1 and len(ec) > 1):
+                    continue
+                for cas_number in cas:
+                    for ec_number in ec:
+                        for identifier, partner in ((cas_number, ec_number), (ec_number, cas_number)):
+                            labels = self.partners.setdefault(identifier, {}).setdefault(partner, [])
+                            if spec.label not in labels:
+                                labels.append(spec.label)
+        conflicts = sum(len(partners) > 1 for partners in self.partners.values())
+        logging.info(f"Identifier crosswalk: {len(self.partners)} numbers paired, {conflicts} with several partners")
+
+    def __len__(self):
+        return len(self.partners)
+
+    def resolve(self, entry):
+        """Partner numbers of a record's CAS and EC number, filling in a missing one.
+
+        A missing CAS (EC) number is filled when the lists give exactly one
+        partner; the "Identifier crosswalk" column shows where the partners
+        come from, or the conflict. Returns all partner numbers to match on.
+        """
+        found = {}
+        for key, other in (("CAS", "EC"), ("EC", "CAS")):
+            partners = self.partners.get(entry[key], {})
+            if partners:
+                found[other] = partners
+        if not found:
+            return []
+
+        notes, conflict = [], False
+        for key, partners in found.items():
+            if list(partners) == [entry[key]]:
+                continue  # The lists agree with the record
+            if len(partners) == 1 and entry[key] == "-":
+                entry[key] = next(iter(partners))
+            else:
+                conflict = True
+            notes.extend(f"{key} {partner} ({', '.join(labels)})" for partner, labels in partners.items())
+        if notes:
+            entry["Identifier crosswalk"] = ("Conflict: " if conflict else "") + SEPARATOR.join(notes)
+        return [partner for partners in found.values() for partner in partners]
@@ -0,0 +1,425 @@
+"""Downloading the EFSA and ECHA source lists.
+
+All downloads go through an optional ``SnapshotCache``: a fresh snapshot is used
+without contacting the portal, an expired one is revalidated with a conditional
+request, and a failed download falls back to the last snapshot on disk.
+
+``download_sources`` fetches all lists concurrently over one pooled session.
+Requests to the same host are capped so ECHA does not throttle us (a streamed
+response keeps its slot until it is closed, so the cap covers the transfers),
+transient failures are retried with jittered backoff, and a source that still
+fails only comes back as None without holding up the others.
+
+Response bodies are streamed in chunks into a spooled temporary file (memory
+up to ``SPOOL_BYTES``, disk beyond) that is hashed and counted on the way and
+capped at ``MAX_DOWNLOAD_BYTES``, so a list is never held in memory twice and
+several runs side by side stay within a predictable memory budget.
+
+requests and BeautifulSoup are only imported once something is downloaded.
+"""
+import contextvars
+import hashlib
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+USER_AGENTS = [
+    'Mozilla/5.0 (iPad; CPU OS 12_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.4844.83 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/99.0.4844.51 Safari/537.36'
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/101.0.4951.64 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; WOW64; rv:91.0) Gecko/20100101 Firefox/91.0',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Mobile/15A372 Safari/604.1',
+    'Mozilla/5.0 (Windows NT 6.1; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.159 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 11_2_3) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Safari/605.1.15',
+    'Mozilla/5.0 (Linux; Android 10; SM-G973F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/102.0.5005.78 Mobile Safari/537.36',
+    'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:98.0) Gecko/20100101 Firefox/98.0',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/117.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 13_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 11; Pixel 5) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.5735.131 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 6.1; WOW64; Trident/7.0; rv:11.0) like Gecko',
+    'Mozilla/5.0 (Linux; Android 12; SM-A525F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.5845.92 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPad; CPU OS 15_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15.5 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 12_6) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.1 Safari/605.1.15',
+    'Mozilla/5.0 (Windows NT 10.0; ARM64; rv:110.0) Gecko/20100101 Firefox/110.0'
+]
+
+EFSA_PPP_URL = "https://www.efsa.europa.eu/en/applications/pesticides"
+PPP_ED_STRING = "overview-endocrine-disrupting-assessment-pesticide-active-substances"
+
+# ECHA dissemination lists, keyed by source name
+ECHA_URLS = {
+    "EDass": "https://echa.europa.eu/en/ed-assessment",
+    "SVHC": "https://echa.europa.eu/en/candidate-list-table",
+    "SVHCintent": "https://echa.europa.eu/en/registry-of-svhc-intentions",
+    "CoRAP": "https://echa.europa.eu/en/information-on-chemicals/evaluation/community-rolling-action-plan/corap-table",
+    "PACT": "https://echa.europa.eu/en/pact",
+}
+
+# Columns requested in the export, when different from the ED assessment default
+ECHA_EXPORT_COLUMNS = {
+    "EDass": "name,ecNumber,casNumber,lec_submitter,prc_public_status,prc_conclusion,diss_update_date,dte_first_published",
+    "SVHC": "name,ecNumber,casNumber,haz_detailed_concern,dte_inclusion,doc_cat_decision,doc_cat_iuclid_dossier,doc_cat_supdoc,doc_cat_rcom,prc_external_remarks",
+    "SVHCintent": "name,ecNumber,casNumber,sid_other_info_external,sid_avi_index_no,prc_public_status,dte_intention,sbm_expected_submission,sbm_first_submission,dte_withdrawn,lec_submitter,prc_external_remarks,haz_detailed_concern,dte_public_consult_start,dte_public_consult_deadline,doc_cat_report,doc_cat_rcom,prc_msc_agreement_year,doc_cat_agreement,dte_adoption,doc_cat_supdoc,doc_cat_opinion,dte_opinion,doc_cat_minor_opinion,dte_inclusion,diss_update_date,dte_first_published",
+    "CoRAP": "name,ecNumber,casNumber,cnt_country,prc_evaluation_year,lec_submitter,haz_detailed_concern,cse_public_lifecycle,diss_update_date,doc_cat_decision,doc_cat_conclusion,doc_cat_justification,dte_corap_publication,lec_contact_address,lec_organization_name,lec_remarks,prc_appeal_link,prc_external_remarks,diss_concern,relevance,dte_first_published",
+}
+
+
+# (connect, read) timeouts in seconds per source; the ECHA exports can take a while to build
+TIMEOUTS = {
+    "PPP": (10, 120),
+    "EDass": (10, 180),
+    "SVHC": (10, 180),
+    "SVHCintent": (10, 300),
+    "CoRAP": (10, 300),
+    "PACT": (10, 300),
+}
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 2.0
+# Longest wait a server's Retry-After can ask for; beyond it we retry after this long anyway
+MAX_RETRY_DELAY = 15 * BACKOFF_SECONDS
+RETRY_STATUS = (429, 500, 502, 503, 504)
+MAX_REQUESTS_PER_HOST = 2
+# Largest list accepted from a portal; a larger answer counts as a failed download
+MAX_DOWNLOAD_BYTES = int(float(os.environ.get("EDSCREENER_MAX_DOWNLOAD_MB", 200)) * 1024 * 1024)
+# Downloads up to this size stay in memory, larger ones roll over to a temporary file
+SPOOL_BYTES = int(float(os.environ.get("EDSCREENER_SPOOL_MB", 8)) * 1024 * 1024)
+CHUNK_BYTES = 64 * 1024
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+class DownloadTooLarge(OSError):
+    """The portal sent more than MAX_DOWNLOAD_BYTES."""
+
+
+def _user_agent():
+    return {'User-Agent': random.choice(USER_AGENTS)}
+
+
+def make_session(pool_size=8):
+    """A session whose connections (and TLS handshakes) are reused by all downloads."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _host_slot(url):
+    host = urlparse(url).netloc
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+        return _host_slots[host]
+
+
+def _retry_delay(attempt, response=None):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_RETRY_DELAY)
+    return BACKOFF_SECONDS * 2 ** attempt + random.uniform(0, BACKOFF_SECONDS)
+
+
+def _release_on_close(response, slot):
+    # A streamed body is read after session.request returns: keep the host slot until the response is closed
+    close = response.close
+    released = False
+
+    def close_and_release():
+        nonlocal released
+        try:
+            close()
+        finally:
+            if not released:
+                released = True
+                slot.release()
+
+    response.close = close_and_release
+
+
+def _send_in_slot(session, method, url, timeout, **kwargs):
+    slot = _host_slot(url)
+    slot.acquire()
+    try:
+        response = session.request(method, url, timeout=timeout, **kwargs)
+    except BaseException:
+        slot.release()
+        raise
+    if kwargs.get("stream"):
+        _release_on_close(response, slot)
+    else:
+        slot.release()
+    return response
+
+
+def request_with_retry(session, method, url, timeout, **kwargs):
+    """Send a request, retrying connection errors and 429/5xx answers with jittered backoff.
+
+    With ``stream=True`` the caller must close the response, which frees its
+    per-host slot.
+    """
+    import requests
+
+    for attempt in range(MAX_RETRIES + 1):
+        last_try = attempt == MAX_RETRIES
+        try:
+            response = _send_in_slot(session, method, url, timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if last_try:
+                raise
+            delay = _retry_delay(attempt)
+            logging.info(f"{method} {url} failed ({e}), retrying in {delay:.1f} s")
+        else:
+            if response.status_code not in RETRY_STATUS or last_try:
+                return response
+            delay = _retry_delay(attempt, response)
+            response.close()
+            logging.info(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f} s")
+        time.sleep(delay)
+
+
+def stream_to_file(response, max_bytes=None):
+    """Copy a streamed response body into a spooled temporary file, positioned at the start.
+
+    The file gets ``sha256`` (hex digest) and ``size`` attributes computed while
+    the chunks arrive. Raises DownloadTooLarge past ``max_bytes``.
+    """
+    max_bytes = max_bytes or MAX_DOWNLOAD_BYTES
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise DownloadTooLarge(f"{response.url} announces {int(length)} bytes, more than {max_bytes}")
+    content = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        for chunk in response.iter_content(CHUNK_BYTES):
+            size += len(chunk)
+            if size > max_bytes:
+                raise DownloadTooLarge(f"{response.url} sent more than {max_bytes} bytes")
+            digest.update(chunk)
+            content.write(chunk)
+    except BaseException:
+        content.close()
+        raise
+    content.seek(0)
+    content.sha256 = digest.hexdigest()
+    content.size = size
+    return content
+
+
+def content_size(content):
+    """Size in bytes of a downloaded list (a streamed download, snapshot or other seekable file)."""
+    size = getattr(content, "size", None)
+    if size is None:
+        position = content.tell()
+        size = content.seek(0, os.SEEK_END)
+        content.seek(position)
+    return size
+
+
+def _fetch_with_cache(source, url, send, cache):
+    """Run ``send(extra_headers)`` through the snapshot cache and return a binary file or None.
+
+    ``send`` performs the actual (possibly conditional) request; it is only
+    called when there is no fresh snapshot.
+    """
+    import requests
+
+    meta = cache.metadata(source) if cache else None
+    if cache and cache.is_fresh(meta):
+        cache.use(source, meta)
+        return cache.open(source)
+
+    try:
+        response = send(cache.conditional_headers(meta) if cache else {})
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Network error while accessing {url}: {e}")
+        response = None
+
+    if response is not None and response.status_code == 304 and meta:
+        response.close()
+        logging.info(f"{source} snapshot from {meta['fetched']} is still current")
+        cache.touch(source, meta)
+        return cache.open(source)
+    if response is not None and response.status_code == 200:
+        try:
+            content = stream_to_file(response)
+        except (requests.exceptions.RequestException, DownloadTooLarge) as e:
+            logging.error(f"Download of {url} failed: {e}")
+            content = None
+        finally:
+            response.close()
+        if content is not None:
+            logging.info(f"Downloaded {url} ({content.size} bytes)")
+            if cache:
+                cache.store(source, content, url, response.headers)
+            return content
+    elif response is not None:
+        logging.info(f"Failed to download {url}. Status code: {response.status_code}")
+        response.close()
+    if meta:
+        # Screening against yesterday's list beats not screening at all
+        logging.warning(f"Falling back to {source} snapshot from {meta['fetched']}")
+        cache.use(source, meta)
+        return cache.open(source)
+    return None
+
+
+def download_efsa_ppp(cache=None, session=None):
+    """Download the EFSA overview of ED assessments for pesticide active substances."""
+    session = session or make_session()
+    timeout = TIMEOUTS["PPP"]
+
+    def send(extra_headers):
+        responseEFSA = request_with_retry(session, "GET", EFSA_PPP_URL, timeout, headers=_user_agent())
+        if responseEFSA.status_code != 200:
+            return responseEFSA
+        from bs4 import BeautifulSoup
+
+        soupEFSA = BeautifulSoup(responseEFSA.text, "html.parser")
+        matching_links = [link.get("href") for link in soupEFSA.find_all("a", href=True)
+                          if PPP_ED_STRING in link.get("href") and link.get("href").endswith(('.xls', '.xlsx'))]
+        soupEFSA.decompose()
+        if not matching_links:
+            logging.info("No EFSA PPP ED file linked on the pesticides page")
+            return None
+        file_url = urljoin(EFSA_PPP_URL, matching_links[0])
+        return request_with_retry(session, "GET", file_url, timeout, headers={**_user_agent(), **extra_headers},
+                                  stream=True)
+
+    return _fetch_with_cache("PPP", EFSA_PPP_URL, send, cache)
+
+
+def count_echa_results(echa_url, source, session):
+    """Read the number of results from an ECHA list page, needed for the export request."""
+    responseECHA = request_with_retry(session, "GET", echa_url, TIMEOUTS[source], headers=_user_agent())
+    unique_substances = None
+    if responseECHA.status_code == 200:
+        from bs4 import BeautifulSoup
+
+        soupECHA = BeautifulSoup(responseECHA.text, "html.parser")
+        small_tag = soupECHA.find("small", class_="search-results")
+        if small_tag:
+            text = small_tag.get_text(strip=True)
+            match = re.search(r"of\s+([\d,]+)\s+results", text)
+            if match:
+                if source == "PACT":
+                    unique_substances = match.group(1).replace(",", "")
+                else:
+                    unique_substances = match.group(1)
+        soupECHA.decompose()
+    responseECHA.close()
+    return unique_substances
+
+
+def download_echa_list(source, cache=None, session=None):
+    """Download one of the ECHA dissemination lists (ED assessment, SVHC, SVHC intent, CoRAP, PACT)."""
+    echa_url = ECHA_URLS[source]
+    session = session or make_session()
+
+    def send(extra_headers):
+        unique_substances = count_echa_results(echa_url, source, session)
+        if not unique_substances:
+            logging.info("Could not determine the number of unique substances.")
+            return None
+
+        # Data or payload sent with the POST request
+        paramsECHA = {
+            "p_p_id": "disslists_WAR_disslistsportlet",
+            "p_p_lifecycle": "2",
+            "p_p_state": "normal",
+            "p_p_mode": "view",
+            "p_p_resource_id": "exportResults",
+            "p_p_cacheability": "cacheLevelPage"
+        }
+        if source == "PACT":
+            paramsECHA["p_p_id"] = "disspact_WAR_disspactportlet"
+            dataECHA = {
+                "_disspact_WAR_disspactportlet_formDate": int(round(time.time() * 1000)),
+                "_disspact_WAR_disspactportlet_exportColumns": "name,ecNumber,casNumber,DISLIST_CORAP,DISLIST_PBT,DISLIST_DOSSIER_EVALUATION,DISLIST_ED,DISLIST_ARN,DISLIST_ROI_CLH,DISLIST_ROI_SVHC,DISLIST_ANX_14_RECOMMENDATION,DISLIST_ROI_RESTRICTION",
+                "_disspact_WAR_disspactportlet_exportDislistsColumns": "DISLIST_CORAP,DISLIST_PBT,DISLIST_DOSSIER_EVALUATION,DISLIST_ED,DISLIST_ARN,DISLIST_ROI_CLH,DISLIST_ROI_SVHC,DISLIST_ANX_14_RECOMMENDATION,DISLIST_ROI_RESTRICTION",
+                "_disspact_WAR_disspactportlet_orderByCol": "name",
+                "_disspact_WAR_disspactportlet_orderByType": "asc",
+                "_disspact_WAR_disspactportlet_orderedSearchableShowListColumns": "DISLIST_PBT_diss_update_date,processes,DISLIST_PBT_diss_concern",
+                "_disspact_WAR_disspactportlet_orderedSearchableShowListElements": "DATE_PICKER,MULTI_VALUE,INPUT_TEXT",
+                "_disspact_WAR_disspactportlet_orderedSearchableShowListProcessColumns": "PACT,PACT,PACT",
+                "_disspact_WAR_disspactportlet_multiValueSearchOperatorprocesses": "AND",
+                "_disspact_WAR_disspactportlet_total": unique_substances,
+                "_disspact_WAR_disspactportlet_exportType": "xls"
+            }
+        else:
+            dataECHA = {
+                "_disslists_WAR_disslistsportlet_formDate": int(round(time.time() * 1000)),
+                "_disslists_WAR_disslistsportlet_exportColumns": ECHA_EXPORT_COLUMNS[source],
+                "_disslists_WAR_disslistsportlet_orderByCol": "diss_update_date",
+                "_disslists_WAR_disslistsportlet_orderByType": "asc",
+                "_disslists_WAR_disslistsportlet_searchFormColumns": "prc_public_status,prc_conclusion,lec_submitter,dte_intention,dte_assessment,diss_update_date",
+                "_disslists_WAR_disslistsportlet_searchFormElements": "DROP_DOWN,DROP_DOWN,DROP_DOWN,DATE_PICKER,DATE_PICKER,DATE_PICKER",
+                "_disslists_WAR_disslistsportlet_total": unique_substances,
+                "_disslists_WAR_disslistsportlet_exportType": "xls"
+            }
+        headersECHA = {
+            **_user_agent(),
+            "Content-Type": "application/x-www-form-urlencoded",
+            **extra_headers,
+        }
+        return request_with_retry(session, "POST", echa_url, TIMEOUTS[source],
+                                  params=paramsECHA, data=dataECHA, headers=headersECHA, stream=True)
+
+    return _fetch_with_cache(source, echa_url, send, cache)
+
+
+def _origin(cache, source, started):
+    # Where a result came from, judged by the snapshot metadata of this run
+    meta = cache.used.get(source) if cache else None
+    if meta is None or meta.get("fetched_at", 0) < started:
+        return "snapshot" if meta else "network"
+    return "revalidated" if meta.get("revalidated") else "network"
+
+
+def download_sources(cache=None, session=None, max_workers=6, metrics=None):
+    """Download all web sources concurrently. Returns source name -> binary file (None if unavailable).
+
+    With ``metrics`` (a RunMetrics) every source is recorded with its time, size and origin.
+    """
+    session = session or make_session(pool_size=max_workers)
+    jobs = {"PPP": lambda: download_efsa_ppp(cache, session)}
+    for source in ECHA_URLS:
+        jobs[source] = lambda source=source: download_echa_list(source, cache, session)
+
+    def run(source):
+        started, wall_started = time.perf_counter(), time.time()
+        content = None
+        try:
+            content = jobs[source]()
+        except Exception as e:
+            # A broken source only leaves its own columns empty
+            logging.error(f"Could not load {source} list: {e}")
+        if metrics:
+            size = content_size(content) if content else 0
+            origin = _origin(cache, source, wall_started) if content else "failed"
+            metrics.add("download", source, time.perf_counter() - started, bytes=size, origin=origin,
+                        transferred=size if origin == "network" else 0)
+        return content
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each task runs in a copy of the caller's context, so its log records stay with the caller's job
+        futures = [executor.submit(contextvars.copy_context().run, run, source) for source in jobs]
+        results = dict(zip(jobs, (future.result() for future in futures)))
+    for source, content in results.items():
+        if content is None:
+            logging.warning(f"{source} list unavailable, its columns stay empty")
+    return results
@@ -0,0 +1,282 @@
+"""C&L classification of the screened substances from ECHA CHEM.
+
+The results columns from "Name ECHA-CHEM" to "C&L notes" come from ECHA CHEM
+(chem.echa.europa.eu): a substance is looked up by its CAS (else EC) number,
+then its C&L inventory overview and its active REACH dossiers are read.
+``enrich_records`` does this for every unique identifier of a run:
+
+* the ``ClassificationCache`` keeps one JSON file per identifier; while it is
+  younger than the TTL (``EDSCREENER_CLP_TTL_DAYS``) it is used without any
+  request, so a substance screened again in a later run costs nothing.
+  Substances ECHA CHEM does not know are cached as well;
+* the other identifiers are fetched by a few worker threads. At most
+  ``REQUESTS_PER_SECOND`` requests are started per second, on top of the
+  per-host cap and the retries of ``downloads.request_with_retry``.
+
+A lookup that fails leaves the columns at "-", is marked in "ECHA-CHEM
+checked" and is not cached, so the next run tries again. Only a well-formed
+search answer without the substance counts as "not listed": a 404 or an
+unexpected answer from the search is a failure.
+
+ECHA CHEM has no documented API. The request paths and the JSON field names
+read by ``classification_values`` (``numberOfNotifications``, ``harmonised``,
+``hazardClassCategory``, ...) are an ASSUMED layout that has not been checked
+against a recorded answer of the live service; the stand-in in
+``benchmarks.chem_portal`` replays synthetic answers in the same assumed
+layout. Until real answers are recorded (set
+``EDSCREENER_ECHA_CHEM_RECORD_DIR`` to save every answer), treat the C&L
+columns as unverified: every run that fetches logs a warning saying so.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from urllib.parse import urlencode
+
+from edscreener.downloads import make_session, request_with_retry
+from edscreener.files import atomic_path
+from edscreener.identifiers import VALID_CAS, VALID_EC, normalise
+from edscreener.screening import KEY_NAMES
+from edscreener.snapshots import DEFAULT_FOLDER
+
+ECHA_CHEM_URL = os.environ.get("EDSCREENER_ECHA_CHEM_URL", "https://chem.echa.europa.eu")
+SEARCH_PATH = "/api-substance/v1/substance"
+CLASSIFICATION_PATH = "/api-cnl-inventory/prominent/overview/classifications/{rml_id}"
+DOSSIER_PATH = "/api-dossier-list/v1/dossier"
+SUBSTANCE_PAGE = "/{rml_id}/overview"
+TIMEOUT = (10, 60)
+DEFAULT_WORKERS = int(os.environ.get("EDSCREENER_CLP_WORKERS", 4))
+REQUESTS_PER_SECOND = float(os.environ.get("EDSCREENER_CLP_RATE", 5))
+DEFAULT_TTL = float(os.environ.get("EDSCREENER_CLP_TTL_DAYS", 30)) * 86400
+RECORD_FOLDER = os.environ.get("EDSCREENER_ECHA_CHEM_RECORD_DIR")
+# Results columns filled from ECHA CHEM
+CLP_COLUMNS = KEY_NAMES[KEY_NAMES.index("Name ECHA-CHEM"):KEY_NAMES.index("C&L notes") + 1]
+SEPARATOR = "; "
+LAYOUT_NOTE = ("The C&L columns are read from ECHA CHEM through an assumed API layout that has not been verified "
+               "against the live service; check important classifications on chem.echa.europa.eu")
+
+
+class RateLimiter:
+    """Spaces the start of requests at least 1/rate seconds apart, across threads (0: no limit)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class ClassificationCache:
+    """ECHA CHEM results per CAS/EC number, one JSON file each."""
+
+    def __init__(self, folder=None, ttl=DEFAULT_TTL):
+        self.folder = folder or os.path.join(DEFAULT_FOLDER, "clp")
+        self.ttl = ttl  # Seconds
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _path(self, identifier):
+        # Identifiers are normalised CAS/EC numbers (digits and hyphens), safe as file names
+        return os.path.join(self.folder, f"{identifier}.json")
+
+    def get(self, identifier):
+        """The cached entry of an identifier while it is fresh, else None."""
+        try:
+            with open(self._path(identifier), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return entry
+
+    def store(self, identifier, entry):
+        path = self._path(identifier)
+        with atomic_path(path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, indent=2, default=str)
+        return entry
+
+
+def new_entry(values):
+    """Cache entry for a lookup; ``values`` None means ECHA CHEM does not list the substance."""
+    return {"fetched_at": time.time(), "fetched": datetime.now().isoformat(timespec="seconds"), "values": values}
+
+
+def recording_name(path, params=None):
+    """File name of a recorded answer (see ``RECORD_FOLDER``), shared with the stand-in server."""
+    name = path.strip("/").replace("/", "_")
+    if params:
+        query = urlencode(sorted((key, str(value)) for key, value in params.items()))
+        name += "_" + hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+    return name + ".json"
+
+
+def _get_json(session, path, params, limiter, missing_ok=False):
+    """JSON answer of an ECHA CHEM request.
+
+    With ``missing_ok`` a 404 Not Found means the substance has no such entry
+    and gives None; otherwise it raises like any other error, since a moved
+    endpoint must not turn into "not listed".
+    """
+    limiter.wait()
+    response = request_with_retry(session, "GET", ECHA_CHEM_URL + path, TIMEOUT, params=params,
+                                  headers={"Accept": "application/json"})
+    try:
+        if missing_ok and response.status_code == 404:
+            return None
+        response.raise_for_status()
+        data = response.json()
+    finally:
+        response.close()
+    if RECORD_FOLDER:
+        os.makedirs(RECORD_FOLDER, exist_ok=True)
+        with open(os.path.join(RECORD_FOLDER, recording_name(path, params)), "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    return data
+
+
+def _joined(values):
+    # Distinct non-empty values in their order, "-" if there are none
+    values = [str(value).strip() for value in values or () if value is not None]
+    return SEPARATOR.join(dict.fromkeys(value for value in values if value)) or "-"
+
+
+def classification_values(substance, classification, dossiers):
+    """Results columns (CLP_COLUMNS) from the ECHA CHEM answers for one substance.
+
+    ``substance`` is the ``substanceIndex`` of the search hit, ``classification``
+    the C&L inventory overview (None if the substance has no C&L entry) and
+    ``dossiers`` the list of active REACH dossiers (None if there are none).
+    """
+    values = {
+        "Name ECHA-CHEM": substance.get("rmlName") or "-",
+        "C&L URL": ECHA_CHEM_URL + SUBSTANCE_PAGE.format(rml_id=substance["rmlId"]),
+        "REACH tonnage band": _joined((item.get("reachDossierInfo") or {}).get("tonnageBand")
+                                      for item in (dossiers or {}).get("items", [])),
+        "On C&L?": "Yes" if classification else "No",
+    }
+    if not classification:
+        return values
+    hazards = classification.get("classifications") or []
+    labelling = classification.get("labelling") or {}
+    values.update({
+        "Entries C&L": classification.get("numberOfNotifications", "-"),
+        "C&L Type": "Harmonised C&L" if classification.get("harmonised") else "Notified C&L",
+        "Joint Entries": "Yes" if classification.get("jointEntries") else "No",
+        "Classification - Hazard classes": _joined(hazard.get("hazardClassCategory") for hazard in hazards),
+        "Classification - Hazard statements": _joined(hazard.get("hazardStatement") for hazard in hazards),
+        "Classification - Organs/ExposureRoute": _joined(
+            " / ".join(filter(None, (hazard.get("organs"), hazard.get("exposureRoute")))) for hazard in hazards),
+        "Labeling - Hazard statements": _joined(labelling.get("hazardStatements")),
+        "Labeling - Supplementary Hazard statements": _joined(labelling.get("supplementaryHazardStatements")),
+        "Labeling - Organs/ExposureRoute": _joined(labelling.get("organs")),
+        "Specific concentration limits": _joined(classification.get("specificConcentrationLimits")),
+        "M-factors": _joined(classification.get("mFactors")),
+        "C&L notes": _joined(classification.get("notes")),
+    })
+    return values
+
+
+def lookup_substance(identifier, session, limiter):
+    """Results columns for one CAS/EC number, or None if ECHA CHEM does not list it."""
+    found = _get_json(session, SEARCH_PATH, {"searchText": identifier, "pageIndex": 1, "pageSize": 100}, limiter)
+    # Only a well-formed answer may say "not listed"; anything else is a failed lookup and is not cached
+    items = found.get("items") if isinstance(found, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) and isinstance(item.get("substanceIndex"), dict)
+                                              for item in items):
+        raise ValueError("unexpected layout of the ECHA CHEM search answer")
+    # The search is a full-text search: only take a hit with exactly this CAS/EC number
+    substance = next((item["substanceIndex"] for item in items
+                      if identifier in (item["substanceIndex"].get("rmlCas"), item["substanceIndex"].get("rmlEc"))),
+                     None)
+    if substance is None:
+        return None
+    rml_id = substance["rmlId"]
+    classification = _get_json(session, CLASSIFICATION_PATH.format(rml_id=rml_id), None, limiter, missing_ok=True)
+    dossiers = _get_json(session, DOSSIER_PATH, {"rmlId": rml_id, "registrationStatuses": "Active",
+                                                 "pageIndex": 1, "pageSize": 100}, limiter, missing_ok=True)
+    return classification_values(substance, classification, dossiers)
+
+
+def record_identifier(entry):
+    """The CAS number of a screened record, else its EC number, else None (invalid input, no name match)."""
+    for key, valid in (("CAS", VALID_CAS), ("EC", VALID_EC)):
+        value, check = normalise(entry.get(key))
+        if check == valid:
+            return value
+    return None
+
+
+def enrich_records(clp_info, cache=None, fetch=True, session=None, workers=DEFAULT_WORKERS, progress=None,
+                   metrics=None, rate=None):
+    """Fill the C&L columns of screened records from ECHA CHEM, each identifier looked up once.
+
+    With ``fetch=False`` (offline runs) only cached substances are filled.
+    ``progress(done, total, message)`` is called per fetched substance.
+    ``rate`` overrides REQUESTS_PER_SECOND (0: no limit).
+    Returns counts of the cached, fetched, not found and failed identifiers.
+    """
+    records = {}
+    for entry in clp_info:
+        identifier = record_identifier(entry)
+        if identifier:
+            records.setdefault(identifier, []).append(entry)
+
+    with metrics.stage("classification", rows=len(records)) if metrics else nullcontext({}) as details:
+        entries = {identifier: cache.get(identifier) for identifier in records} if cache else {}
+        missing = [identifier for identifier in records if entries.get(identifier) is None]
+        counts = {"cached": len(records) - len(missing), "fetched": 0, "not_found": 0, "failed": 0}
+        if missing and fetch:
+            logging.warning(LAYOUT_NOTE)
+            session = session or make_session(pool_size=workers)
+            limiter = RateLimiter(REQUESTS_PER_SECOND if rate is None else rate)
+
+            def fetch_one(identifier):
+                try:
+                    entry = new_entry(lookup_substance(identifier, session, limiter))
+                except Exception as e:
+                    logging.warning(f"ECHA CHEM lookup of {identifier} failed: {e}")
+                    return None
+                return cache.store(identifier, entry) if cache else entry
+
+            if progress:
+                progress(0, len(missing), "Looking up C&L classifications in ECHA CHEM")
+            with ThreadPoolExecutor(workers, thread_name_prefix="echa-chem") as executor:
+                # Each lookup runs in a copy of the caller's context, so its log records stay with the caller's job
+                futures = [executor.submit(contextvars.copy_context().run, fetch_one, identifier)
+                           for identifier in missing]
+                for done, (identifier, future) in enumerate(zip(missing, futures), start=1):
+                    entry = future.result()
+                    entries[identifier] = entry
+                    counts["fetched" if entry else "failed"] += 1
+                    if progress:
+                        progress(done, len(missing), f"C&L {done}/{len(missing)}: {identifier}")
+
+        checked = "Lookup failed" if fetch else "Not checked (offline)"
+        for identifier, rows in records.items():
+            entry = entries.get(identifier)
+            if entry is None:
+                updates = {"ECHA-CHEM checked": checked}
+            elif entry["values"] is None:
+                counts["not_found"] += 1
+                updates = {"ECHA-CHEM checked": f"Not listed ({entry['fetched'][:10]})", "On C&L?": "No"}
+            else:
+                updates = {**entry["values"], "ECHA-CHEM checked": entry["fetched"][:10]}
+            for record in rows:
+                record.update(updates)
+        details.update(counts)
+    logging.info(f"C&L classifications: {counts['cached']} cached, {counts['fetched']} fetched, "
+                 f"{counts['not_found']} not listed, {counts['failed']} failed")
+    return counts
@@ -0,0 +1,241 @@
+"""Writing the screening results workbook (results sheet plus "Summary" sheet).
+
+The workbook is written in a single pass with openpyxl's write-only mode: every
+record becomes one row on the results sheet and one row on the Summary sheet
+as it is emitted, so memory use does not grow with the number of records.
+Column widths and merged cells are declared before the first row, hyperlinks
+and header styles are set on the cells as they are written.
+
+The Summary sheet holds either plain values computed here ("values", the
+default) or the original Excel formulas referring to the results sheet
+("formulas"). Values open instantly and can be read with pandas; formulas
+follow manual edits of the results sheet.
+
+Records screened with hits="long" carry every matching source row; those
+are written to an extra "All hits" sheet, one row per hit and column.
+"""
+from io import BytesIO
+
+from edscreener.sources import HITS_KEY, is_missing
+
+RESULTS_SHEET = "Sheet1"
+SUMMARY_SHEET = "Summary"
+HITS_SHEET = "All hits"
+HITS_HEADERS = ["id", "Input", "CAS", "EC", "Source", "Hit", "Column", "Value"]
+# Results columns written as clickable links
+LINK_COLUMNS = ("C&L URL", "PACT: SEv link", "PACT: DEv link", "PACT: ARN link", "PACT: CLH link")
+# Number of columns that get a fixed width
+FORMATTED_COLUMNS = 105
+SUMMARY_MODES = ("values", "formulas")
+
+# Set up mapping for classification
+classification_mapping = {
+    'reproductive toxicity': ['H360', 'H360F', 'H360FD', 'H360Fd', 'H360Df', 'H361', 'H361f', 'H361d', 'H361fd','H362'],
+    'STOT-RE': ['H372', 'H373'],
+    'carcinogenicity': ['H350', 'H350i', 'H351']
+}
+
+# Headers of the "Summary" sheet
+SUMMARY_HEADERS = [
+    ["", "", "", "", "", "Evaluated for ED in", "", "", "", "", "", "Also found in", "", ""],
+    ["Name (ECHA-CHEM)", "Input", "CAS number", "EC number", "Classification", "ED assessment",
+     "On BPR/PPPR list (for ED-HH; for ED-ENV)", "REACH SVHC candidate", "REACH SVHC intent",
+     "CORAP List", "PACT: DEv", "PACT: ARN", "Food lists", "Summary Harmonized", "Summary self-classified"]
+]
+
+
+def determine_classification(value):
+    """Summarise the hazard statements of a substance as the most relevant classification."""
+    # "-" is what records carry when ECHA CHEM gave no hazard statements
+    if is_missing(value) or value.strip() in ('', '-'):
+        return '-'
+    for outcome, codes in classification_mapping.items():
+        if any(code in value for code in codes):
+            return outcome
+    return 'other classification'
+
+
+def classification_summary(record):
+    """(harmonised, self-classified) assessment of one record; only one of them applies."""
+    assessment = determine_classification(record.get('Classification - Hazard statements'))
+    if record.get("C&L Type") == "Harmonised C&L":
+        return assessment, "-"
+    return "-", assessment
+
+
+def _cell_text(value):
+    # The text Excel shows for a referenced cell inside a concatenation
+    if not isinstance(value, str) and is_missing(value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def summary_values(clp_info):
+    """Summary columns A-O computed for all records at once, as a DataFrame in sheet order."""
+    import pandas as pd
+
+    df = pd.DataFrame(clp_info)
+
+    def text(column):
+        if column not in df:
+            return pd.Series("", index=df.index)
+        return df[column].map(_cell_text)
+
+    def if_yes(flag, then):
+        return then.where(text(flag) == "Yes", "No")
+
+    classification = text("Classification - Hazard statements")
+    ed_flag = text("ED Assessment List: Yes/No")
+    assessment = df["Classification - Hazard statements"].map(determine_classification)
+    harmonised = df["C&L Type"] == "Harmonised C&L"
+    food = ("Yes (" + text("Food additive: E number") + "; " + text("Food flavourings: FL") + ")").where(
+        (text("Food additive: Yes/No") == "Yes") | (text("Food flavourings: Yes/No") == "Yes"), "No")
+
+    return pd.DataFrame({
+        "Name": text("Name ECHA-CHEM"),
+        "Input": text("Input"),
+        "CAS": text("CAS"),
+        "EC": text("EC"),
+        "Classification": classification.where(classification != "", "Not classified"),
+        "ED assessment": ed_flag + (" (" + text("ED Assessment List: Outcome") + ")").where(
+            ~ed_flag.isin(["No", ""]), ""),
+        "BPR/PPP": "BPR: " + if_yes("BPR: Yes/No", "Yes (HH: " + text("BPR: ED HH") + "; ENV: " +
+                                    text("BPR: ED ENV") + ")") +
+                   "; PPR: " + if_yes("ED PPP: Yes/No", "Yes (HH: " + text("ED PPP: Conclusion HH") + "; ENV: " +
+                                      text("ED PPP: Conclusion non-TO") + ")"),
+        "SVHC": if_yes("SVHC: Yes/No", "Yes: " + text("SVHC: Reason")),
+        "SVHC intent": if_yes("SVHC intent: Yes/No", "Yes: " + text("SVHC intent: Status")),
+        "CoRAP": text("CoRAP: Yes/No") + " (" + text("CoRAP: Initial grounds of Concern") + "; " +
+                 text("CoRAP: Status") + ")",
+        "PACT: DEv": text("PACT: DEv"),
+        "PACT: ARN": text("PACT: ARN"),
+        "Food lists": food,
+        "Summary Harmonized": assessment.where(harmonised, "-"),
+        "Summary self-classified": assessment.where(~harmonised, "-"),
+    })
+
+
+def summary_formulas(letters, row):
+    """Formulas of Summary columns A-M, referring to row ``row`` of the results sheet."""
+    def ref(column):
+        return f"{RESULTS_SHEET}!{letters[column]}{row}"
+
+    return [
+        f"={ref('Name ECHA-CHEM')}",  # Name
+        f"={ref('Input')}",  # Input
+        f"={ref('CAS')}",  # CAS
+        f"={ref('EC')}",  # EC
+        # Classification
+        f'=IF({ref("Classification - Hazard statements")}<>"",{ref("Classification - Hazard statements")},"Not classified")',
+        # ED assessment list
+        f'=CONCATENATE({ref("ED Assessment List: Yes/No")},IF(OR({ref("ED Assessment List: Yes/No")}="No",'
+        f'{ref("ED Assessment List: Yes/No")}=""),""," ("&{ref("ED Assessment List: Outcome")}&")"))',
+        # BPR/PPP ED?
+        f'="BPR: "&IF({ref("BPR: Yes/No")}="Yes","Yes (HH: " &{ref("BPR: ED HH")}& "; ENV: " &{ref("BPR: ED ENV")}& ")","No")&'
+        f'"; PPR: "&IF({ref("ED PPP: Yes/No")}="Yes","Yes (HH: "&{ref("ED PPP: Conclusion HH")} &"; ENV: " &'
+        f'{ref("ED PPP: Conclusion non-TO")}& ")","No")',
+        # REACH SVHC candidate ED?
+        f'=IF({ref("SVHC: Yes/No")}="Yes","Yes: " & {ref("SVHC: Reason")},"No")',
+        # REACH SVHC intent ED?
+        f'=IF({ref("SVHC intent: Yes/No")}="Yes","Yes: " & {ref("SVHC intent: Status")},"No")',
+        # CORAP list ED?
+        f'={ref("CoRAP: Yes/No")}&" ("&{ref("CoRAP: Initial grounds of Concern")}&"; "&{ref("CoRAP: Status")}&")"',
+        f"={ref('PACT: DEv')}",  # PACT: DEv
+        f"={ref('PACT: ARN')}",  # PACT: ARN
+        # Food additives/flavourings
+        f'=IF(OR({ref("Food additive: Yes/No")}="Yes",{ref("Food flavourings: Yes/No")}="Yes"),"Yes (" & '
+        f'{ref("Food additive: E number")} & "; " & {ref("Food flavourings: FL")} & ")", "No")',
+    ]
+
+
+def _cell_value(value):
+    # Missing values are written as empty cells, like DataFrame.to_excel does
+    if value is None or (isinstance(value, float) and is_missing(value)):
+        return None
+    return value
+
+
+def write_results_workbook(clp_info, output, summary="values"):
+    """Write the results workbook for the screened records to a path or binary file object.
+
+    ``summary`` is one of SUMMARY_MODES.
+    """
+    if summary not in SUMMARY_MODES:
+        raise ValueError(f"Unknown summary mode: {summary}")
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.utils import get_column_letter
+
+    # Keys starting with "_" are not results columns
+    columns = list(dict.fromkeys(key for record in clp_info for key in record if not key.startswith("_")))
+    long_hits = any(isinstance(record.get(HITS_KEY), list) for record in clp_info)
+    letters = {column: get_column_letter(i) for i, column in enumerate(columns, start=1)}
+    link_positions = {columns.index(column) for column in LINK_COLUMNS if column in columns}
+
+    wb = Workbook(write_only=True)
+    ws_results = wb.create_sheet(RESULTS_SHEET)
+    ws_summary = wb.create_sheet(SUMMARY_SHEET)
+    ws_hits = wb.create_sheet(HITS_SHEET) if long_hits else None
+
+    # Some formatting: widths and merged cells have to be known before the first row
+    for col in range(1, FORMATTED_COLUMNS + 1):
+        col_letter = get_column_letter(col)
+        ws_results.column_dimensions[col_letter].width = 12
+        ws_summary.column_dimensions[col_letter].width = 15
+    ws_summary.merged_cells.add("F1:J1")
+
+    wrap = Alignment(wrap_text=True)
+    ws_results.append([_styled_cell(ws_results, column, alignment=wrap) for column in columns])
+    for row_data in SUMMARY_HEADERS:
+        ws_summary.append([_styled_cell(ws_summary, value, alignment=wrap, font=Font(bold=True))
+                           for value in row_data])
+    if ws_hits:
+        ws_hits.append([_styled_cell(ws_hits, value, font=Font(bold=True)) for value in HITS_HEADERS])
+
+    if summary == "values":
+        summary_rows = summary_values(clp_info).itertuples(index=False, name=None) if clp_info else ()
+    else:
+        summary_rows = (summary_formulas(letters, row) + list(classification_summary(record))
+                        for row, record in enumerate(clp_info, start=2))
+
+    link_style = Font(color="0000FF", underline="single")
+    for record, summary_row in zip(clp_info, summary_rows):
+        values = [_cell_value(record.get(column)) for column in columns]
+        for position in link_positions:
+            # Make the URLs clickable
+            cell = WriteOnlyCell(ws_results, value=values[position])
+            if isinstance(values[position], str) and values[position] != "-":
+                cell.hyperlink = values[position]
+            cell.font = link_style
+            values[position] = cell
+        ws_results.append(values)
+        ws_summary.append(summary_row)
+        if ws_hits and isinstance(record.get(HITS_KEY), list):
+            for source, number, row in record[HITS_KEY]:
+                for column, value in row.items():
+                    ws_hits.append([record.get("id"), record.get("Input"), record.get("CAS"), record.get("EC"),
+                                    source, number, column, _cell_value(value)])
+
+    wb.save(output)
+
+
+def _styled_cell(ws, value, alignment=None, font=None):
+    from openpyxl.cell import WriteOnlyCell
+
+    cell = WriteOnlyCell(ws, value=value)
+    if alignment:
+        cell.alignment = alignment
+    if font:
+        cell.font = font
+    return cell
+
+
+def build_results_workbook(clp_info, summary="values"):
+    """Results workbook for the screened records, as a BytesIO positioned at the start."""
+    final_output = BytesIO()
+    write_results_workbook(clp_info, final_output, summary)
+    final_output.seek(0)
+    return final_output
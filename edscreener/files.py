@@ -0,0 +1,27 @@
+"""Files written in place of older versions, never seen half-written.
+
+Snapshots, parsed lists, cached classifications, job states and checkpoints
+are read by other threads, processes or a resumed run while they are being
+replaced. Each is written to a temporary file next to the target and moved
+over it in one step once complete, so a reader or a crash only ever sees the
+old file or the new one.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path):
+    """Temporary path to write ``path`` to; it replaces ``path`` when the block succeeds.
+
+    The name is unique per process and thread, so concurrent writers of one
+    file do not share a temporary file. A failed write leaves ``path`` as it was.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
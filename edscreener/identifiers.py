@@ -0,0 +1,79 @@
+"""Normalisation and validation of CAS and EC numbers.
+
+Customer lists come out of Excel with tabs, odd dashes, leading zeros, CAS
+numbers stored as plain numbers (``50000.0``) and sometimes as dates. Every
+input is brought to its canonical form (``50-00-0``) and checked against the
+CAS or EC check digit before it is screened.
+"""
+import re
+from datetime import date, datetime
+
+CAS_PATTERN = re.compile(r"(\d{2,7})-(\d{2})-(\d)")
+EC_PATTERN = re.compile(r"(\d{3})-(\d{3})-(\d)")
+# Hyphen look-alikes that end up in copied CAS numbers
+DASHES = "\u2010\u2011\u2012\u2013\u2014\u2015\u2212\ufe63\uff0d"
+
+# Values of the "Input check" column
+VALID_CAS = "Valid CAS"
+VALID_EC = "Valid EC"
+INVALID_CHECKSUM = "Invalid: wrong check digit"
+INVALID_FORMAT = "Invalid: not a CAS or EC number"
+INVALID_DATE = "Invalid: converted to a date by Excel"
+NAME_INPUT = "Name"  # Substance name input, screened through its best name match
+
+
+def cas_checksum_ok(cas):
+    """CAS check digit: weighted sum of the other digits (from the right, weights 1, 2, ...) modulo 10."""
+    match = CAS_PATTERN.fullmatch(cas)
+    if not match:
+        return False
+    digits = (match.group(1) + match.group(2))[::-1]
+    return sum((i + 1) * int(d) for i, d in enumerate(digits)) % 10 == int(match.group(3))
+
+
+def ec_checksum_ok(ec):
+    """EC check digit: weighted sum of the first six digits (weights 1 to 6) modulo 11."""
+    match = EC_PATTERN.fullmatch(ec)
+    if not match:
+        return False
+    digits = match.group(1) + match.group(2)
+    return sum((i + 1) * int(d) for i, d in enumerate(digits)) % 11 == int(match.group(3))
+
+
+def clean(value):
+    """Keep only digits and hyphens (the historic input cleaning)."""
+    return re.sub(r'[^\d\-]', '', str(value))
+
+
+def normalise(value):
+    """Return (identifier, check) for one raw input value.
+
+    ``identifier`` is the canonical CAS/EC number when the value could be
+    recognised, otherwise the digits and hyphens of the raw value.
+    """
+    if isinstance(value, (datetime, date)):
+        return clean(value), INVALID_DATE
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+
+    text = str(value).strip()
+    for dash in DASHES:
+        text = text.replace(dash, "-")
+    text = re.sub(r"\s+", "", text)
+    if re.fullmatch(r"\d+\.0+", text):  # "50000.0" from a numeric cell read as text
+        text = text.split(".")[0]
+    text = clean(text)
+
+    # CAS number without hyphens, e.g. 50000 -> 50-00-0
+    if text.isdigit() and 5 <= len(text) <= 10:
+        text = f"{text[:-3]}-{text[-3:-1]}-{text[-1]}"
+
+    if EC_PATTERN.fullmatch(text):
+        return text, VALID_EC if ec_checksum_ok(text) else INVALID_CHECKSUM
+
+    match = re.fullmatch(r"0*(\d+)-(\d{2})-(\d)", text)
+    if match:
+        cas = "-".join(match.groups())
+        if CAS_PATTERN.fullmatch(cas):
+            return cas, VALID_CAS if cas_checksum_ok(cas) else INVALID_CHECKSUM
+    return text, INVALID_FORMAT
@@ -0,0 +1,218 @@
+"""Incremental rescreening against the results of a previous run.
+
+Every run stores a digest per source identifier (``source_digests.json``: source
+-> identifier -> hash of the source row it points to). Comparing those digests
+with the current indexes gives the identifiers that were added, removed or
+modified since the previous run. Only input rows carrying such an identifier
+are screened again; the other rows are copied from the previous results.
+
+Rows are marked in the "Changed since last run" column ("Yes", "No" or "New")
+and the sources whose block changed are listed in "Changed sources". With the
+"long" hit mode the per-hit rows of the copied records are rebuilt from the
+current indexes, which have not changed for them.
+"""
+import hashlib
+import json
+import logging
+import os
+import zipfile
+from datetime import date, datetime
+
+from edscreener.identifiers import NAME_INPUT
+from edscreener.screening import KEY_NAMES, screen_record, screen_records
+from edscreener.sources import HITS_KEY, SOURCES, is_missing
+
+RESULTS_NAME = "EDscreener_results.xlsx"
+DIGESTS_NAME = "source_digests.json"
+# Columns that belong to the row itself rather than to the screening outcome
+OWN_COLUMNS = ("id", "Input", "Input check", "Changed since last run", "Changed sources",
+               "Name match", "Name match score", "Name candidates")
+
+
+def _comparable(value):
+    # Values read back from the results workbook come with other types than the source cells
+    if not isinstance(value, str) and is_missing(value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, date):
+        # Same text as a datetime at midnight
+        value = datetime.combine(value, datetime.min.time()).isoformat()
+    return str(value).strip()
+
+
+def _row_digest(row):
+    text = json.dumps([_comparable(row[column]) for column in sorted(row)])
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _rows_digest(row_digests):
+    # One row keeps its own digest; an identifier on several rows gets a digest of all of them
+    if len(row_digests) == 1:
+        return row_digests[0]
+    return hashlib.sha1("".join(row_digests).encode("ascii")).hexdigest()
+
+
+def source_digests(indexes):
+    """Source name -> {identifier: digest of its source rows} for all loaded indexes."""
+    digests = {}
+    for name, index in indexes.items():
+        row_digests = [_row_digest(row) for row in index.rows]
+        digests[name] = {identifier: _rows_digest([row_digests[row_number] for row_number in row_numbers])
+                         for identifier, row_numbers in index.keys.items()}
+    return digests
+
+
+def changed_identifiers(previous_digests, indexes):
+    """Source name -> identifiers added, removed or modified since the previous run.
+
+    None means the changes are unknown (source not loaded in one of the runs)
+    and every row has to be screened again for it.
+    """
+    current_digests = source_digests(indexes)
+    changed = {}
+    for spec in SOURCES:
+        old, new = previous_digests.get(spec.name), current_digests.get(spec.name)
+        if old is None and new is None:
+            changed[spec.name] = set()
+        elif old is None or new is None:
+            changed[spec.name] = None
+        else:
+            changed[spec.name] = {identifier for identifier in old.keys() | new.keys()
+                                  if old.get(identifier) != new.get(identifier)}
+        if changed[spec.name] is None:
+            logging.info(f"{spec.label} list: no previous state, all rows are rescreened")
+        else:
+            logging.info(f"{spec.label} list: {len(changed[spec.name])} identifiers changed since last run")
+    return changed
+
+
+class PreviousRun:
+    """Results and source digests of an earlier run."""
+
+    def __init__(self, records, digests):
+        self.records = {}  # Input -> first result record with that input
+        for record in records:
+            self.records.setdefault(_comparable(record.get("Input")), record)
+        self.digests = digests
+        self.changed = None
+
+    def compare(self, indexes):
+        self.changed = changed_identifiers(self.digests, indexes)
+
+    def is_affected(self, record, crosswalk=None):
+        """True if any source changed for one of the identifiers of a previous record.
+
+        With a ``crosswalk`` the partner numbers of its CAS and EC number count too.
+        """
+        identifiers = {_comparable(record.get(key)) for key in ("Input", "CAS", "EC")} - {"", "-"}
+        if crosswalk:
+            identifiers.update(partner for key in ("CAS", "EC")
+                               for partner in crosswalk.partners.get(_comparable(record.get(key)), ()))
+        for spec in SOURCES:
+            changed = self.changed[spec.name]
+            if changed is None or identifiers & changed:
+                return True
+        return False
+
+
+def _read_results(file):
+    import pandas as pd
+
+    df = pd.read_excel(file, sheet_name=0, engine="openpyxl")
+    return [{key: _plain(value) for key, value in row.items()} for row in df.to_dict("records")]
+
+
+def _plain(value):
+    # The values pandas reads back, as screening puts them in a record: None, datetime, int, ...
+    if not isinstance(value, str) and is_missing(value):
+        return None
+    if hasattr(value, "to_pydatetime"):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):  # numpy scalar
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)  # Integer column with empty cells, read as float
+    return value
+
+
+def load_previous(path):
+    """Read a previous run from a results package (zip), an output folder or a results workbook."""
+    digests = {}
+    if isinstance(path, str) and os.path.isdir(path):
+        records = _read_results(os.path.join(path, RESULTS_NAME))
+        digests_path = os.path.join(path, DIGESTS_NAME)
+        if os.path.exists(digests_path):
+            with open(digests_path, encoding="utf-8") as f:
+                digests = json.load(f)
+    elif zipfile.is_zipfile(path) and RESULTS_NAME in zipfile.ZipFile(path).namelist():
+        with zipfile.ZipFile(path) as package:
+            with package.open(RESULTS_NAME) as f:
+                records = _read_results(f)
+            if f"databases/{DIGESTS_NAME}" in package.namelist():
+                digests = json.loads(package.read(f"databases/{DIGESTS_NAME}"))
+    else:
+        records = _read_results(path)
+    if not digests:
+        logging.warning("Previous run has no source digests, every row is rescreened")
+    logging.info(f"Previous run loaded: {len(records)} rows")
+    return PreviousRun(records, digests)
+
+
+def _changed_sources(entry, old):
+    labels = []
+    for spec in SOURCES:
+        columns = [spec.flag, *spec.fields]
+        if any(_comparable(entry.get(column)) != _comparable(old.get(column)) for column in columns):
+            labels.append(spec.label)
+    return labels
+
+
+def rescreen_records(clp_info, indexes, previous, screened=None, progress=None, metrics=None, hits="first",
+                     crosswalk=None):
+    """Screen only the records affected by source changes, copy the others from the previous run.
+
+    ``hits`` and ``crosswalk`` are passed on to ``screen_records``.
+    """
+    if previous.changed is None:
+        previous.compare(indexes)
+    to_screen = []
+    for entry in clp_info:
+        old = previous.records.get(entry["Input"])
+        if old is not None and entry["Input check"] == NAME_INPUT and \
+                any(entry[key] not in ("-", _comparable(old.get(key))) for key in ("CAS", "EC")):
+            # The name now matches another substance (a number the match lacks may come from the crosswalk)
+            old = None
+        if old is not None and not previous.is_affected(old, crosswalk):
+            # An empty cell of the previous results is "-", as in a freshly screened record
+            entry.update({key: "-" if old.get(key) is None else old[key] for key in KEY_NAMES if key not in OWN_COLUMNS})
+            entry["Changed since last run"] = "No"
+            if hits == "long":
+                _rebuild_hits(entry, indexes, crosswalk)
+        else:
+            to_screen.append(entry)
+    logging.info(f"Incremental run: {len(clp_info) - len(to_screen)} rows carried forward, "
+                 f"{len(to_screen)} rows to screen")
+
+    screen_records(to_screen, indexes, screened, progress, metrics, hits=hits, crosswalk=crosswalk)
+    for entry in to_screen:
+        old = previous.records.get(entry["Input"])
+        if old is None:
+            entry["Changed since last run"] = "New"
+            continue
+        labels = _changed_sources(entry, old)
+        entry["Changed since last run"] = "Yes" if labels else "No"
+        if labels:
+            entry["Changed sources"] = ", ".join(labels)
+    return clp_info
+
+
+def _rebuild_hits(entry, indexes, crosswalk):
+    # The results workbook has no per-hit rows to copy; the lists did not change for this record,
+    # so matching it again on a scratch record gives the same hits
+    scratch = {key: entry[key] for key in ("Input", "Input check", "CAS", "EC")}
+    screen_record(scratch, indexes, hits="long", crosswalk=crosswalk)
+    if HITS_KEY in scratch:
+        entry[HITS_KEY] = scratch[HITS_KEY]
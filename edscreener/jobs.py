@@ -0,0 +1,193 @@
+"""Background screening jobs with an on-disk job store.
+
+Screening inside the Streamlit button handler froze the browser session and
+was thrown away by any rerun. ``JobRunner`` runs jobs on a pool of worker
+threads instead: a job is accepted, gets an id straight away and waits in the
+queue until one of ``EDSCREENER_MAX_JOBS`` workers is free.
+
+Every job has a folder in the ``JobStore`` with its input files, its log, a
+``job.json`` status file (progress, recent events, warnings, error, metrics)
+and finally the results package. The page only needs the job id to show the
+progress and offer the package, also after a reload or from another session.
+Jobs that were running when the server stopped are marked as failed, queued
+ones are started again.
+
+The job log takes every record logged for the job, also by the download and
+ECHA CHEM worker threads: the job id is kept in a context variable that those
+pools pass on to their tasks.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from edscreener.files import atomic_path
+from edscreener.pipeline import UPLOADED_LISTS, run_screening
+from edscreener.progress import throttled_progress
+
+DEFAULT_FOLDER = os.environ.get("EDSCREENER_JOBS_DIR", os.path.join(os.getcwd(), "output", "jobs"))
+DEFAULT_MAX_JOBS = int(os.environ.get("EDSCREENER_MAX_JOBS", 2))
+# Finished jobs (and their packages) are removed after this many seconds
+DEFAULT_MAX_AGE = float(os.environ.get("EDSCREENER_JOB_DAYS", 7)) * 86400
+JOB_FILE = "job.json"
+LOG_NAME = "EDscreener_log.txt"
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+ACTIVE = ("queued", "running")
+# Seconds between writes of the job status during screening
+STATUS_INTERVAL = 1.0
+JOB_ID_PATTERN = re.compile(r"\d{8}-\d{6}-[0-9a-f]{8}")
+# Id of the job the current code runs for (None outside jobs)
+CURRENT_JOB = contextvars.ContextVar("screening_job", default=None)
+
+
+class JobStore:
+    def __init__(self, folder=None):
+        self.folder = folder or DEFAULT_FOLDER
+        os.makedirs(self.folder, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def path(self, job_id, *names):
+        # Job ids come from URLs, never let them point outside the store
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            raise ValueError(f"Invalid job id: {job_id}")
+        return os.path.join(self.folder, job_id, *names)
+
+    def create(self, params, files):
+        """Store a new queued job and return its id.
+
+        ``files`` maps a role ("input", "BPR", "previous", ...) to (file name, bytes).
+        """
+        job_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        stored = {}
+        for role, (name, content) in files.items():
+            # One folder per role keeps the original file name (it names the list in the package)
+            relative = os.path.join("inputs", role, os.path.basename(name))
+            os.makedirs(self.path(job_id, "inputs", role))
+            with open(self.path(job_id, relative), "wb") as f:
+                f.write(content)
+            stored[role] = relative
+        job = {"id": job_id, "status": "queued", "created": datetime.now().isoformat(timespec="seconds"),
+               "started": None, "finished": None, "params": params, "files": stored, "progress": 0.0,
+               "message": "Waiting for a free worker", "events": [], "warnings": [], "error": None,
+               "package": None, "metrics": None}
+        self._write(job)
+        return job_id
+
+    def _write(self, job):
+        path = self.path(job["id"], JOB_FILE)
+        with atomic_path(path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, indent=2, default=str)
+
+    def load(self, job_id):
+        """The job with this id, or None if it does not exist (any more)."""
+        try:
+            with open(self.path(job_id, JOB_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update(self, job_id, **changes):
+        """Change fields of a job; returns the job, or None if it was removed meanwhile."""
+        with self._lock:
+            job = self.load(job_id)
+            if job is None:
+                return None
+            job.update(changes)
+            self._write(job)
+        return job
+
+    def jobs(self):
+        """All stored jobs, newest first."""
+        jobs = [self.load(name) for name in sorted(os.listdir(self.folder), reverse=True)
+                if JOB_ID_PATTERN.fullmatch(name)]
+        return [job for job in jobs if job]
+
+    def prune(self, max_age=DEFAULT_MAX_AGE):
+        """Remove finished jobs older than ``max_age`` seconds, with their files."""
+        for job in self.jobs():
+            if job["status"] not in ACTIVE and time.time() - os.path.getmtime(self.path(job["id"], JOB_FILE)) > max_age:
+                shutil.rmtree(self.path(job["id"]), ignore_errors=True)
+                logging.info(f"Removed old job {job['id']}")
+
+
+class JobRunner:
+    def __init__(self, store, run, max_workers=DEFAULT_MAX_JOBS):
+        """``run(job, folder, progress, warn)`` does the work of a job and returns the status
+        fields to store when it is done (e.g. the package name)."""
+        self.store = store
+        self.run = run
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="screening-job")
+        store.prune()
+        # Jobs left behind by a previous server process
+        for job in reversed(store.jobs()):
+            if job["status"] == "running":
+                store.update(job["id"], status="failed", error="Interrupted: the server was restarted")
+            elif job["status"] == "queued":
+                self.executor.submit(self._run, job["id"])
+
+    def submit(self, params, files):
+        """Queue a job (see ``JobStore.create``) and return its id immediately."""
+        job_id = self.store.create(params, files)
+        self.executor.submit(self._run, job_id)
+        logging.info(f"Job {job_id} queued")
+        return job_id
+
+    def _run(self, job_id):
+        job = self.store.update(job_id, status="running", started=datetime.now().isoformat(timespec="seconds"),
+                                message="Started")
+        if job is None:
+            logging.info(f"Job {job_id} was removed before it started")
+            return
+        # The job log only takes the records of this job, from this thread or the pools it starts
+        token = CURRENT_JOB.set(job_id)
+        handler = logging.FileHandler(self.store.path(job_id, LOG_NAME), encoding="utf-8")
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler.addFilter(lambda record: CURRENT_JOB.get() == job_id)
+        logging.getLogger().addHandler(handler)
+
+        warned = []
+        progress = throttled_progress(
+            lambda tracker, text: self.store.update(job_id, progress=tracker.fraction, message=text,
+                                                    events=list(tracker.recent)),
+            interval=STATUS_INTERVAL)
+
+        def warn(message):
+            logging.warning(message)
+            warned.append(message)
+            self.store.update(job_id, warnings=warned)
+
+        try:
+            result = self.run(job, self.store.path(job_id), progress, warn)
+            self.store.update(job_id, status="done", finished=datetime.now().isoformat(timespec="seconds"),
+                              progress=1.0, message="Finished", **result)
+            logging.info(f"Job {job_id} finished")
+        except Exception as e:
+            logging.exception(f"Job {job_id} failed")
+            self.store.update(job_id, status="failed", finished=datetime.now().isoformat(timespec="seconds"),
+                              message="Failed", error=str(e))
+        finally:
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+            CURRENT_JOB.reset(token)
+
+
+def screen_job(job, folder, progress, warn, shared_cache=None):
+    """Run a screening job stored by the Streamlit page (see ``pipeline.run_screening``)."""
+    files = {role: Path(folder, relative) for role, relative in job["files"].items()}
+    params = job["params"]
+    offline = params.get("offline_folder") or (str(files["offline"]) if "offline" in files else None)
+    package_path, metrics = run_screening(
+        files["input"], folder, uploads={source: files[source] for source in UPLOADED_LISTS if source in files},
+        shared_cache=shared_cache, summary=params["summary"], hits=params["hits"], offline=offline,
+        ttl=params["ttl"], previous=str(files["previous"]) if "previous" in files else None,
+        compression_level=params["compression_level"], progress=progress, warn=warn,
+        log_path=os.path.join(folder, LOG_NAME), classification=params.get("classification", False))
+    return {"package": os.path.basename(package_path), "metrics": metrics.table()}
@@ -0,0 +1,110 @@
+"""Per-stage timing and volume metrics of a screening run.
+
+Every stage (a source download, a parse, the match loop per source, writing
+the results, packaging) is recorded with its wall time, bytes, rows and the
+peak resident memory while it ran. The records go into the results package as
+``metrics.json`` and are shown as a table in the app, so a slow portal or a
+source that suddenly doubles in size stands out.
+
+The peak RSS is a value of the whole process. It is reset at the start of a
+stage (Linux only) unless another stage is being measured at the same time,
+e.g. by a second screening job; the peak of overlapping stages is then the
+process peak since the earliest of them started.
+"""
+import json
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_NAME = "metrics.json"
+
+# Stages measuring the peak RSS right now, in any run of this process
+_measuring = 0
+_measuring_lock = threading.Lock()
+
+
+def reset_peak_rss():
+    """Reset the peak RSS to the current RSS (Linux only; elsewhere the peak stays process-wide)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Peak resident memory in bytes (since the last reset where supported), None if unknown."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if platform.system() == "Darwin" else maxrss * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    return getattr(memory, "peak_wset", memory.rss)  # Peak working set on Windows
+
+
+class RunMetrics:
+    def __init__(self):
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, source=None, seconds=None, **details):
+        record = {"stage": stage, "source": source,
+                  "seconds": round(seconds, 3) if seconds is not None else None, **details}
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, stage, source=None, peak=True, **details):
+        """Time a block; the yielded dict takes extra details (bytes, rows, ...).
+
+        Use ``peak=False`` for stages that run concurrently, since the peak RSS
+        is a process-wide value (see the module docstring).
+        """
+        global _measuring
+        if peak:
+            with _measuring_lock:
+                if not _measuring:
+                    reset_peak_rss()
+                _measuring += 1
+        started = time.perf_counter()
+        try:
+            yield details
+        finally:
+            if peak:
+                with _measuring_lock:
+                    _measuring -= 1
+                rss = peak_rss()
+                details["peak_rss_mb"] = round(rss / 1e6, 1) if rss is not None else None
+            self.add(stage, source, time.perf_counter() - started, **details)
+
+    def table(self):
+        """Records as rows for a short table (stage, source, seconds, MB, rows, peak RSS)."""
+        return [{"Stage": record["stage"], "Source": record["source"] or "",
+                 "Seconds": record["seconds"],
+                 "MB": round(record["bytes"] / 1e6, 2) if record.get("bytes") is not None else None,
+                 "Rows": record.get("rows"),
+                 "Peak RSS (MB)": record.get("peak_rss_mb")}
+                for record in self.records]
+
+    def to_json(self):
+        with self._lock:
+            return json.dumps({"started": self.started, "stages": self.records}, indent=2, default=str)
@@ -0,0 +1,178 @@
+"""Screening by substance name, for inventories without CAS numbers.
+
+All loaded source lists carry substance names. ``NameIndex`` normalises them
+once (lower case, no accents, punctuation reduced to single spaces) and builds
+an inverted index from character trigrams to names (numpy arrays of name
+ids). A query is scored against every name sharing a trigram with it by
+counting the posting lists of its trigrams in one vectorised pass, so a query
+costs the length of those lists, not a comparison with every name. Trigrams
+found in most names (a shared "substance " or "acid") are stored as the list
+of names *without* them, so no list is longer than half the names. The score
+is the Jaccard similarity of the trigram sets.
+
+The best match gives the CAS/EC numbers the record is then screened with;
+the ranked candidates are reported next to it.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from typing import NamedTuple
+
+from edscreener.identifiers import NAME_INPUT, VALID_CAS, VALID_EC, normalise
+from edscreener.screening import KEY_NAMES
+from edscreener.sources import SOURCES
+
+DEFAULT_MIN_SCORE = 0.5
+DEFAULT_CANDIDATES = 3
+# Input column headers taken as substance names when there is no "CAS" column
+NAME_COLUMNS = ("substance name", "name", "chemical name", "iupac name", "trade name", "substance")
+
+
+class NameMatch(NamedTuple):
+    name: str  # Name as written in the first source listing it
+    score: float  # Trigram similarity, 1.0 for the same normalised name
+    locations: list  # (source name, row number) of every row with this name
+
+
+def normalise_name(value):
+    """Lower case, accents removed, everything but letters and digits reduced to single spaces."""
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def trigrams(name):
+    """Character trigrams of a normalised name, padded so short names and word starts count."""
+    padded = f"  {name} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class NameIndex:
+    """Trigram index over the substance names of all loaded source lists."""
+
+    def __init__(self, indexes):
+        import numpy as np
+
+        self.indexes = indexes
+        self.ids = {}  # Normalised name -> name id
+        self.labels = []  # Name id -> name as written in the source
+        self.locations = []  # Name id -> [(source name, row number)]
+        postings = defaultdict(list)  # Trigram -> name ids
+        sizes = []  # Name id -> number of trigrams
+        for spec in SOURCES:
+            if spec.name not in indexes:
+                continue
+            for row_number, name in enumerate(indexes[spec.name].names):
+                key = normalise_name(name)
+                if not key:
+                    continue
+                name_id = self.ids.get(key)
+                if name_id is None:
+                    name_id = self.ids[key] = len(self.labels)
+                    self.labels.append(name)
+                    self.locations.append([])
+                    grams = trigrams(key)
+                    sizes.append(len(grams))
+                    for gram in grams:
+                        postings[gram].append(name_id)
+                self.locations[name_id].append((spec.name, row_number))
+        self.sizes = np.array(sizes, dtype=np.int32)
+        self.postings = {}  # Trigram -> ids of the names containing it
+        self.absent = {}  # Trigram found in most names -> ids of the names without it
+        all_ids = np.arange(len(self.labels), dtype=np.int32)
+        for gram, ids in postings.items():
+            if len(ids) > len(self.labels) // 2:
+                self.absent[gram] = np.setdiff1d(all_ids, ids, assume_unique=True)
+            else:
+                self.postings[gram] = np.array(ids, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def search(self, query, limit=DEFAULT_CANDIDATES, min_score=DEFAULT_MIN_SCORE):
+        """Names scoring at least ``min_score`` against the query, best first (at most ``limit``)."""
+        import numpy as np
+
+        key = normalise_name(query)
+        if not key:
+            return []
+
+        grams = trigrams(key)
+        present = [self.postings[gram] for gram in grams if gram in self.postings]
+        absent = [self.absent[gram] for gram in grams if gram in self.absent]
+        if not present and not absent:
+            return []
+        # Shared trigrams per name; names sharing none stay at 0 and score 0
+        shared = np.zeros(len(self.labels), dtype=np.int64)
+        if present:
+            shared += np.bincount(np.concatenate(present), minlength=len(self.labels))
+        if absent:
+            shared += len(absent) - np.bincount(np.concatenate(absent), minlength=len(self.labels))
+        scores = shared / (len(grams) + self.sizes - shared)
+        hits = np.flatnonzero(scores >= min_score)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        ranked = sorted(hits, key=lambda name_id: (-scores[name_id], self.labels[name_id]))
+        return [NameMatch(self.labels[name_id], round(float(scores[name_id]), 3), self.locations[name_id])
+                for name_id in ranked]
+
+    def identifiers(self, match):
+        """(CAS, EC) listed for a matched name, "-" where none of its rows has one."""
+        cas = ec = "-"
+        for source, row_number in match.locations:
+            for identifier in self.indexes[source].identifiers[row_number]:
+                value, check = normalise(identifier)
+                if check == VALID_CAS and cas == "-":
+                    cas = value
+                elif check == VALID_EC and ec == "-":
+                    ec = value
+            if cas != "-" and ec != "-":
+                break
+        return cas, ec
+
+
+def name_column(headers):
+    """Header of the substance name column of an input file, or None."""
+    normalised = {normalise_name(header): header for header in headers if header is not None}
+    for candidate in NAME_COLUMNS:
+        if candidate in normalised:
+            return normalised[candidate]
+    return None
+
+
+def read_names(file):
+    """Values of the substance name column of an input workbook, or None if there is no such column."""
+    import pandas as pd
+
+    df = pd.read_excel(file, engine="openpyxl")
+    column = name_column(df.columns)
+    if column is None:
+        return None
+    return [str(value).strip() for value in df[column].dropna()]
+
+
+def name_records(raw_names, name_index, first_id=1, limit=DEFAULT_CANDIDATES, min_score=DEFAULT_MIN_SCORE):
+    """Result records for substance names, with CAS/EC taken from the best name match.
+
+    Each distinct normalised name is looked up once. Records without a match
+    keep "-" as CAS and EC and are reported as not listed.
+    """
+    matched = {}
+    clp_info = []
+    for i, value in enumerate(raw_names):
+        name = str(value).strip()
+        record = {"id": first_id + i, **{key: "-" for key in KEY_NAMES}, "Input": name, "Input check": NAME_INPUT}
+        key = normalise_name(name)
+        if key not in matched:
+            candidates = name_index.search(name, limit, min_score)
+            matched[key] = {}
+            if candidates:
+                cas, ec = name_index.identifiers(candidates[0])
+                matched[key] = {"CAS": cas, "EC": ec, "Name match": candidates[0].name,
+                                "Name match score": candidates[0].score,
+                                "Name candidates": "; ".join(f"{c.name} ({c.score:.2f})" for c in candidates)}
+        record.update(matched[key])
+        clp_info.append(record)
+    return clp_info
@@ -0,0 +1,107 @@
+"""Offline source sets: screening against the lists bundled with an earlier run.
+
+Every results package carries the source workbooks it was screened against
+in ``databases/``. ``load_offline_sources`` reads them back, from the package
+itself or from a folder (an unpacked package, or a snapshot cache folder), so
+a run can be repeated without any network access: deterministic for audits,
+and still possible while the portals are down.
+"""
+import json
+import logging
+import os
+import zipfile
+from io import BytesIO
+
+from edscreener.sources import SOURCES
+
+# Names of the downloaded lists inside a results package
+PACKAGE_NAMES = {
+    "PPP": "EFSA_PPP_ED_Database.xlsx",
+    "EDass": "ED assessment_Database.xlsx",
+    "SVHC": "SVHC_Database.xlsx",
+    "SVHCintent": "SVHC intent_Database.xlsx",
+    "PACT": "PACT_Database.xlsx",
+    "CoRAP": "CoRAP_Database.xlsx",
+}
+# Source name -> workbook name in databases/, written with every package
+SOURCE_MAP_NAME = "sources.json"
+SNAPSHOTS_NAME = "snapshots.json"
+# Lists that are uploaded by the user and stored under their own file name
+UPLOADED_HEADERS = {"BPR": "meets ed criteria", "food_add": "e number", "food_flav": "fl no"}
+
+
+def _detect_upload(content):
+    """Which uploaded list (BPR, food_add, food_flav) a workbook is, from its sheet and headers, or None."""
+    import openpyxl
+
+    try:
+        workbook = openpyxl.load_workbook(BytesIO(content), read_only=True, data_only=True)
+    except Exception:
+        return None
+    try:
+        for spec in SOURCES:
+            if spec.name not in UPLOADED_HEADERS or spec.sheet not in workbook.sheetnames:
+                continue
+            for values in workbook[spec.sheet].iter_rows(max_row=20, values_only=True):
+                texts = " ".join(str(value).lower() for value in values if value is not None)
+                if UPLOADED_HEADERS[spec.name] in texts:
+                    return spec.name
+    finally:
+        workbook.close()
+    return None
+
+
+def _read_folder(folder):
+    # An unpacked package has the workbooks in databases/
+    if os.path.isdir(os.path.join(folder, "databases")):
+        folder = os.path.join(folder, "databases")
+    files = {}
+    for name in os.listdir(folder):
+        if name.endswith((".xlsx", ".json")):
+            with open(os.path.join(folder, name), "rb") as f:
+                files[name] = f.read()
+    return files
+
+
+def _read_package(package_file):
+    with zipfile.ZipFile(package_file) as package:
+        return {name[len("databases/"):]: package.read(name) for name in package.namelist()
+                if name.startswith("databases/") and name.endswith((".xlsx", ".json"))}
+
+
+def load_offline_sources(path):
+    """Source files from a results package (zip, path or file object) or a folder.
+
+    Returns (source name -> BytesIO, manifest text). Lists that are not in the
+    set are missing from the result, like a failed download.
+    """
+    if isinstance(path, str) and os.path.isdir(path):
+        files = _read_folder(path)
+    else:
+        files = _read_package(path)
+
+    source_map = json.loads(files[SOURCE_MAP_NAME]) if SOURCE_MAP_NAME in files else {}
+    found = {}
+    for source, name in source_map.items():
+        if name in files:
+            found[source] = name
+    for source, name in PACKAGE_NAMES.items():
+        # Package names first, then snapshot cache names (<source>.xlsx)
+        for candidate in (name, f"{source}.xlsx"):
+            if source not in found and candidate in files:
+                found[source] = candidate
+    for name, content in files.items():
+        if name.endswith(".xlsx") and name not in found.values():
+            source = _detect_upload(content)
+            if source and source not in found:
+                found[source] = name
+
+    source_files = {source: BytesIO(files[name]) for source, name in found.items()}
+    for source, name in found.items():
+        logging.info(f"Offline {source} list: {name} ({len(files[name])} bytes)")
+    snapshots = json.loads(files[SNAPSHOTS_NAME]) if SNAPSHOTS_NAME in files else {
+        source: json.loads(files[f"{source}.json"]) for source in found if f"{source}.json" in files}
+    label = path if isinstance(path, str) else getattr(path, "name", "uploaded package")
+    manifest = json.dumps({"offline_source_set": os.path.basename(str(label)), "files": found,
+                           "snapshots": snapshots}, indent=2)
+    return source_files, manifest
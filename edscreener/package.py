@@ -0,0 +1,57 @@
+"""Assembling the results package (zip).
+
+Entries are streamed into the archive one at a time in fixed-size blocks, so
+the package is never held in memory as a whole. Uploaded and downloaded lists
+are copied byte for byte (no openpyxl round trip that could drop formatting),
+and the results workbook is written straight into its archive entry.
+"""
+import os
+import shutil
+import tempfile
+import zipfile
+
+DEFAULT_COMPRESSION_LEVEL = 6  # 0 stores the entries uncompressed; xlsx files are zip archives already
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def _copy(content, entry):
+    if callable(content):
+        content(entry)  # Writer, e.g. the results workbook
+    elif isinstance(content, (bytes, bytearray, memoryview)):
+        entry.write(content)
+    elif isinstance(content, str):
+        entry.write(content.encode("utf-8"))
+    elif isinstance(content, os.PathLike):
+        with open(content, "rb") as f:
+            shutil.copyfileobj(f, entry, COPY_BLOCK_SIZE)
+    else:
+        if content.seekable():
+            content.seek(0)
+        shutil.copyfileobj(content, entry, COPY_BLOCK_SIZE)
+
+
+def write_package(target, entries, compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """Write ``(name, content)`` entries to a zip at ``target`` (path or binary file object).
+
+    ``content`` is bytes, text, a path (``os.PathLike``), a binary file object
+    or a callable that writes to the entry; entries with content None are skipped.
+    """
+    if compression_level == 0:
+        options = {"compression": zipfile.ZIP_STORED}
+    else:
+        options = {"compression": zipfile.ZIP_DEFLATED, "compresslevel": compression_level}
+    with zipfile.ZipFile(target, "w", **options) as package:
+        for name, content in entries:
+            if content is None:
+                continue
+            # The size of written entries is not known up front, allow them to pass 2 GB
+            with package.open(name, "w", force_zip64=callable(content)) as entry:
+                _copy(content, entry)
+
+
+def write_package_file(entries, compression_level=DEFAULT_COMPRESSION_LEVEL, folder=None):
+    """Write the package to a new temporary file on disk and return its path."""
+    handle, path = tempfile.mkstemp(prefix="EDscreener_package_", suffix=".zip", dir=folder)
+    with os.fdopen(handle, "wb") as f:
+        write_package(f, entries, compression_level)
+    return path
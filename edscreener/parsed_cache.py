@@ -0,0 +1,124 @@
+"""Columnar cache of parsed source lists.
+
+Parsing an ECHA export with openpyxl takes seconds; loading the handful of
+columns the screener actually uses from a columnar file takes milliseconds.
+Each parsed list is stored under the hash of the source file plus a
+fingerprint of its ``SourceSpec``, so a new export (or a change in what we
+extract) is a cache miss and is parsed again.
+
+Parquet is used when pyarrow is installed, otherwise a pickled DataFrame.
+Either way a warm read returns exactly the values of a cold parse (dates stay
+datetimes, numbers keep their type), so the results and the source digests do
+not depend on whether the cache was hit.
+"""
+import hashlib
+import importlib.util
+import logging
+import os
+import pickle
+
+from edscreener.files import atomic_path
+from edscreener.snapshots import DEFAULT_FOLDER
+from edscreener.sources import PARSER_VERSION, SourceIndex, build_index
+
+# Checked without importing pyarrow; pandas loads it when a cache file is read or written
+FORMAT = "parquet" if importlib.util.find_spec("pyarrow") else "pkl"
+
+# Separates identifiers packed into one string column
+SEPARATOR = "\x1f"
+# Bump when the layout of the cache files changes
+CACHE_VERSION = 2
+# Parquet column holding the pickled values of a results column that is not plain text or floats
+PICKLED_PREFIX = "_pickled:"
+# Value types parquet stores and pandas reads back unchanged (None aside)
+NATIVE_TYPES = ({str}, {float})
+
+
+def content_digest(workbook_file):
+    """SHA-256 of an uploaded file, file object or path, read in blocks.
+
+    Streamed downloads carry the hash computed while they arrived.
+    """
+    digest = getattr(workbook_file, "sha256", None)
+    if digest:
+        return digest
+    if hasattr(workbook_file, "seek"):
+        workbook_file.seek(0)
+        digest = hashlib.file_digest(workbook_file, "sha256").hexdigest()
+        workbook_file.seek(0)
+        return digest
+    with open(workbook_file, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def spec_fingerprint(spec):
+    text = repr((PARSER_VERSION, CACHE_VERSION, spec.name, spec.sheet, spec.fields))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+class ParsedCache:
+    def __init__(self, folder=None):
+        self.folder = folder or os.path.join(DEFAULT_FOLDER, "parsed")
+        os.makedirs(self.folder, exist_ok=True)
+
+    def path(self, spec, digest):
+        return os.path.join(self.folder, f"{spec.name}_{digest[:20]}_{spec_fingerprint(spec)}.{FORMAT}")
+
+    def load_index(self, spec, workbook_file):
+        """Return the SourceIndex of a workbook, parsing it only if it was never seen before."""
+        path = self.path(spec, content_digest(workbook_file))
+        if os.path.exists(path):
+            try:
+                index = self._read(spec, path)
+                logging.info(f"{spec.label} list loaded from parsed cache ({len(index)} rows)")
+                return index
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable parsed cache {path}: {e}")
+
+        if hasattr(workbook_file, "seek"):
+            workbook_file.seek(0)
+        index = build_index(spec, workbook_file)
+        try:
+            self._write(index, path)
+        except Exception as e:
+            # The cache is an optimisation only, never fail the run for it
+            logging.warning(f"Could not write parsed cache {path}: {e}")
+        return index
+
+    @staticmethod
+    def _write(index, path):
+        import pandas as pd
+
+        columns = list(index.spec.fields)
+        # Object columns keep the parsed values as they are (no int -> float for columns with gaps)
+        df = pd.DataFrame(index.rows, columns=columns, dtype=object)
+        df["_identifiers"] = [SEPARATOR.join(ids) for ids in index.identifiers]
+        if index.names:
+            df["_names"] = index.names
+
+        if FORMAT == "parquet":
+            # Parquet needs one type per column and reads ints and dates back as other types:
+            # anything but plain text or floats is stored as pickled values
+            for position, column in enumerate(columns):
+                types = {type(value) for value in df[column] if value is not None}
+                if types and types not in NATIVE_TYPES:
+                    df.insert(position, PICKLED_PREFIX + column, [pickle.dumps(value) for value in df.pop(column)])
+        with atomic_path(path) as tmp_path:
+            if FORMAT == "parquet":
+                df.to_parquet(tmp_path, index=False)
+            else:
+                df.to_pickle(tmp_path)
+
+    @staticmethod
+    def _read(spec, path):
+        import pandas as pd
+
+        df = pd.read_parquet(path) if FORMAT == "parquet" else pd.read_pickle(path)
+        identifiers = [ids.split(SEPARATOR) if ids else [] for ids in df.pop("_identifiers")]
+        names = [name if isinstance(name, str) else None for name in df.pop("_names")] if "_names" in df else []
+        df = df.astype(object).where(df.notna(), None)
+        for column in df.columns:
+            if column.startswith(PICKLED_PREFIX):
+                df[column] = [pickle.loads(value) for value in df[column]]
+        df.columns = [column.removeprefix(PICKLED_PREFIX) for column in df.columns]
+        return SourceIndex(spec, df.to_dict("records"), identifiers, names)
@@ -0,0 +1,168 @@
+"""A complete screening run, independent of the front end.
+
+Reads the input, gets the source lists (downloaded, or from an offline source
+set), screens every record and writes the results package. The background
+jobs of the Streamlit page run it; messages for the user go to ``warn`` and
+unusable inputs raise ValueError, so nothing here depends on Streamlit.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+
+from edscreener.crosswalk import Crosswalk
+from edscreener.downloads import download_sources
+from edscreener.echa_chem import ClassificationCache, enrich_records
+from edscreener.export import write_results_workbook
+from edscreener.incremental import DIGESTS_NAME, load_previous, rescreen_records, source_digests
+from edscreener.metrics import METRICS_NAME, RunMetrics
+from edscreener.names import NameIndex, name_records, read_names
+from edscreener.offline import PACKAGE_NAMES, SOURCE_MAP_NAME, load_offline_sources
+from edscreener.package import DEFAULT_COMPRESSION_LEVEL, write_package_file
+from edscreener.parsed_cache import ParsedCache
+from edscreener.screening import load_indexes, new_records, read_input, screen_records
+from edscreener.snapshots import DEFAULT_TTL, SnapshotCache
+
+# Lists the user uploads, with the warning shown when one is missing
+UPLOADED_LISTS = {
+    "BPR": "Please upload an Excel file for BPR ED.",
+    "food_add": "Please upload an Excel file for food additives.",
+    "food_flav": "Please upload an Excel file for food flavourings.",
+}
+
+
+def run_screening(input_file, output_folder, uploads=None, shared_cache=None, summary="values", hits="first",
+                  offline=None, ttl=DEFAULT_TTL, previous=None, compression_level=DEFAULT_COMPRESSION_LEVEL,
+                  progress=None, warn=None, log_path=None, cache_folder=None, classification=False):
+    """Screen ``input_file`` and write the results package into ``output_folder``.
+
+    ``uploads`` maps BPR/food_add/food_flav to workbooks (paths or file objects).
+    ``offline`` is a results package or folder whose source lists are used
+    instead of downloading; ``previous`` an earlier package to rescreen
+    incrementally. ``shared_cache`` (a SharedCache) shares downloads and
+    parsed lists with other runs. ``progress(done, total, message)`` and
+    ``warn(message)`` report to the user; the log at ``log_path`` goes into
+    the package. ``cache_folder`` holds the snapshots and parsed lists (default:
+    ``snapshots.DEFAULT_FOLDER``) and the cached ECHA CHEM classifications;
+    ``classification`` fills the C&L columns from ECHA CHEM (offline runs only
+    from that cache); it is off by default since every new substance costs
+    about three requests. Returns (package path, RunMetrics).
+    """
+    warn = warn or logging.warning
+    logging.info("Started ED screener process")
+    metrics = RunMetrics()
+    with metrics.stage("read_input") as details:
+        raw_values = read_input(input_file)
+        # Inventories without CAS numbers are screened by substance name
+        names = read_names(input_file) if raw_values is None else None
+        details["rows"] = len(raw_values if raw_values is not None else names or [])
+    if raw_values is None and names is None:
+        raise ValueError("'CAS' column (or a substance name column) not found.")
+    total = details["rows"]
+    if progress:
+        progress(0, total, "Loading source lists")
+
+    #### LOAD DATA SOURCES ####
+    offline_files = {}
+    if offline:
+        # No HTTP at all: the lists come from an earlier package or folder
+        if isinstance(offline, str) and not os.path.exists(offline):
+            raise ValueError(f"Offline source set not found: {offline}")
+        with metrics.stage("sources"):
+            offline_files, snapshot_manifest = load_offline_sources(offline)
+        downloaded = {source: offline_files.get(source) for source in PACKAGE_NAMES}
+    elif shared_cache:
+        # Downloads are shared by all runs of the process and go through the on-disk snapshot cache
+        with metrics.stage("sources"):
+            downloaded, snapshot_manifest = shared_cache.download_sources(SnapshotCache(cache_folder, ttl=ttl),
+                                                                          ttl=ttl, metrics=metrics)
+    else:
+        snapshot_cache = SnapshotCache(cache_folder, ttl=ttl)
+        with metrics.stage("sources"):
+            downloaded = download_sources(snapshot_cache, metrics=metrics)
+        snapshot_manifest = snapshot_cache.manifest()
+    # Uploaded lists, else the copies from the offline source set
+    uploads = dict(uploads or {})
+    for source, message in UPLOADED_LISTS.items():
+        if uploads.get(source) is None:
+            uploads[source] = offline_files.get(source)
+        if uploads[source] is None:
+            warn(message)
+
+    #### INDEX DATA SOURCES (parsed once per run) ####
+    source_files = {**{source: downloaded.get(source) for source in PACKAGE_NAMES}, **uploads}
+    # Lists that were parsed before (same bytes) come from the shared cache, else from the columnar cache
+    parsed_cache = shared_cache or ParsedCache(os.path.join(cache_folder, "parsed") if cache_folder else None)
+    indexes = load_indexes(source_files, parsed_cache, metrics)
+    with metrics.stage("crosswalk") as details:
+        crosswalk = Crosswalk(indexes)
+        details["rows"] = len(crosswalk)
+    if names is None:
+        clp_info = new_records(raw_values)
+        invalid = sum(entry["Input check"].startswith("Invalid") for entry in clp_info)
+        if invalid:
+            warn(f"{invalid} input(s) are not valid CAS/EC numbers, see the 'Input check' column.")
+    else:
+        with metrics.stage("name_match", rows=len(names)) as details:
+            name_index = NameIndex(indexes)
+            clp_info = name_records(names, name_index)
+            details["names"] = len(name_index)
+        unmatched = sum(entry["Name match"] == "-" for entry in clp_info)
+        if unmatched:
+            warn(f"{unmatched} name(s) did not match any listed substance, see the 'Name candidates' column.")
+
+    #### LOOP OVER ALL CAS NUMBERS ####
+    def report(done, total, entry):
+        # Finalize the loop per chemical
+        logging.info(f"Processed {done}/{total}: {entry['CAS']}")
+        if progress:
+            progress(done, total, f"Processed {done}/{total}: {entry['CAS']}")
+
+    if previous:
+        rescreen_records(clp_info, indexes, load_previous(previous), progress=report, metrics=metrics, hits=hits,
+                         crosswalk=crosswalk)
+    else:
+        screen_records(clp_info, indexes, progress=report, metrics=metrics, hits=hits, crosswalk=crosswalk)
+    conflicts = sum(entry["Identifier crosswalk"].startswith("Conflict") for entry in clp_info)
+    if conflicts:
+        warn(f"{conflicts} input(s) have CAS/EC numbers that the lists pair differently, "
+             f"see the 'Identifier crosswalk' column.")
+
+    #### C&L CLASSIFICATION (ECHA CHEM) ####
+    if classification:
+        cache = ClassificationCache(os.path.join(cache_folder, "clp") if cache_folder else None)
+        counts = enrich_records(clp_info, cache, fetch=not offline, progress=progress, metrics=metrics)
+        if counts["failed"]:
+            warn(f"{counts['failed']} substance(s) could not be looked up in ECHA CHEM, "
+                 f"see the 'ECHA-CHEM checked' column.")
+
+    ### SAVING ####
+    # Stream the package to a file on disk; sources are copied verbatim, the results are written into the zip
+    def write_results(f):
+        with metrics.stage("write_results", rows=len(clp_info)):
+            write_results_workbook(clp_info, f, summary)
+
+    entries = [
+        ("EDscreener_results.xlsx", write_results),
+        ("EDscreener_log.txt", Path(log_path) if log_path else None),
+        ("databases/snapshots.json", snapshot_manifest),
+        (f"databases/{DIGESTS_NAME}", json.dumps(source_digests(indexes))),
+    ]
+    entries += [(f"databases/{name}", downloaded.get(source)) for source, name in PACKAGE_NAMES.items()]
+    source_map = {source: name for source, name in PACKAGE_NAMES.items() if downloaded.get(source)}
+    for source in UPLOADED_LISTS:
+        if uploads[source] is not None:
+            source_map[source] = os.path.basename(getattr(uploads[source], "name", None) or f"{source}.xlsx")
+            entries.append((f"databases/{source_map[source]}", uploads[source]))
+    # Which workbook is which list, for offline runs against this package
+    entries.append((f"databases/{SOURCE_MAP_NAME}", json.dumps(source_map, indent=2)))
+    # Written last, so it covers every stage before packaging
+    entries.append((METRICS_NAME, lambda f: f.write(metrics.to_json().encode("utf-8"))))
+
+    if progress:
+        progress(total, total, "Writing the results package")
+    with metrics.stage("package") as details:
+        package_path = write_package_file(entries, compression_level, folder=output_folder)
+        details["bytes"] = os.path.getsize(package_path)
+    logging.info(f"Results package written: {package_path}")
+    return package_path, metrics
@@ -0,0 +1,86 @@
+"""Time-throttled progress reporting for the front ends.
+
+Screening calls back once per substance, far more often than a browser or a
+Tk window can usefully redraw. ``ProgressTracker`` counts the finished items,
+keeps a short log of the latest events and says when an update is due (at
+most every ``interval`` seconds, and always for the last item), together with
+the rate and the estimated time left.
+"""
+import time
+from collections import deque
+
+DEFAULT_INTERVAL = 0.25  # Seconds between UI updates
+DEFAULT_LOG_SIZE = 12  # Recent events shown
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600} h {seconds % 3600 // 60:02d} min"
+    if seconds >= 60:
+        return f"{seconds // 60} min {seconds % 60:02d} s"
+    return f"{seconds} s"
+
+
+class ProgressTracker:
+    def __init__(self, total, interval=DEFAULT_INTERVAL, log_size=DEFAULT_LOG_SIZE):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.recent = deque(maxlen=log_size)
+        self.started = time.monotonic()
+        self._last_update = None
+
+    def update(self, done, message=None):
+        """Record progress; returns True when the UI should be redrawn."""
+        self.done = done
+        if message:
+            self.recent.append(message)
+        now = time.monotonic()
+        if self._last_update is None or now - self._last_update >= self.interval or done >= self.total:
+            self._last_update = now
+            return True
+        return False
+
+    @property
+    def fraction(self):
+        return min(self.done / self.total, 1.0) if self.total else 1.0
+
+    @property
+    def rate(self):
+        """Items per second so far."""
+        elapsed = time.monotonic() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Estimated seconds left, None while unknown."""
+        return (self.total - self.done) / self.rate if self.rate else None
+
+    def summary(self):
+        text = f"{self.done}/{self.total} processed, {self.rate:.0f}/s"
+        if self.done < self.total and self.eta is not None:
+            text += f", about {format_duration(self.eta)} left"
+        return text
+
+
+def throttled_progress(report, interval=DEFAULT_INTERVAL):
+    """A ``progress(done, total, message)`` callback for ``run_screening`` that redraws at most every ``interval``.
+
+    ``report(tracker, text)`` redraws the front end; ``text`` is the tracker
+    summary, or the stage message (loading the lists, ...) before the first
+    substance. A stage with another total starts a new tracker that keeps the
+    recent events.
+    """
+    tracker = None
+
+    def progress(done, total, message):
+        nonlocal tracker
+        if tracker is None or tracker.total != total:
+            recent = tracker.recent if tracker else ()
+            tracker = ProgressTracker(total, interval=interval)
+            tracker.recent.extend(recent)
+        if tracker.update(done, message):
+            report(tracker, tracker.summary() if done else message)
+
+    return progress
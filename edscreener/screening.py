@@ -0,0 +1,136 @@
+"""Screening of substance records against the indexed source lists.
+
+This is the front-end independent part of ``process_data``: reading the input
+CAS numbers, creating the result records and matching them against every
+loaded source. The Streamlit page, the Tk window and the command line all use it.
+
+Inputs are normalised and validated first (see ``identifiers``). Every unique
+identifier is screened once and its results are copied to all input rows
+carrying it, so a substance listed twenty times costs one lookup.
+"""
+import logging
+import time
+from contextlib import nullcontext
+
+from edscreener.identifiers import NAME_INPUT, VALID_EC, normalise
+from edscreener.sources import SOURCES, apply_match, build_index
+
+KEY_NAMES = [
+    "Input", "CAS", "EC", "Name ECHA-CHEM", "ECHA-CHEM checked", "REACH tonnage band", "On C&L?", "Entries C&L",
+    "C&L URL", "C&L Type", "Joint Entries", "Classification - Hazard classes",
+    "Classification - Hazard statements", "Classification - Organs/ExposureRoute",
+    "Labeling - Hazard statements", "Labeling - Supplementary Hazard statements",
+    "Labeling - Organs/ExposureRoute", "Specific concentration limits", "M-factors", "C&L notes",
+    "ED PPP: Yes/No", "ED PPP: Status", "ED PPP: Conclusion HH", "ED PPP: Conclusion non-TO",
+    "ED PPP: EFSA conclusion link",
+    "BPR: Yes/No", "BPR: ED HH", "BPR: ED ENV",
+    "ED Assessment List: Yes/No", "ED Assessment List: Outcome",
+    "ED Assessment List: Status", "ED Assessment List: Authority", "ED Assessment List: Last updated",
+    "SVHC: Yes/No", "SVHC: Reason", "SVHC: Date Inclusion", "SVHC: Decision",
+    "Food additive: Yes/No", "Food additive: E number", "Food flavourings: Yes/No", "Food flavourings: FL",
+    "SVHC intent: Yes/No", "SVHC intent: Status", "SVHC intent: Scope", "SVHC intent: Last updated",
+    "PACT: Yes/No", "PACT: SEv", "PACT: SEv link", "PACT: DEv", "PACT: DEv link", "PACT: ED", "PACT: ED link",
+    "PACT: ARN", "PACT: ARN link", "PACT: PBT", "PACT: PBT link", "PACT: CLH", "PACT: CLH link", "PACT: SVHC",
+    "PACT: SVHC link",
+    "CoRAP: Yes/No", "CoRAP: Initial grounds of Concern", "CoRAP: Status", "CoRAP: Latest update",
+    "Input check", "Identifier crosswalk", "Changed since last run", "Changed sources", "Name match",
+    "Name match score", "Name candidates"
+]
+
+
+def read_input(file):
+    """Raw values of the 'CAS' column of an input workbook, or None if there is no such column."""
+    import pandas as pd
+
+    CASallpd = pd.read_excel(file, engine="openpyxl")
+    if "CAS" not in CASallpd.columns:
+        return None
+    return CASallpd["CAS"].dropna().tolist()
+
+
+def new_records(raw_values, first_id=1):
+    """One empty result record ("-" in every column) per input value, with the normalised input."""
+    clp_info = []
+    for i, value in enumerate(raw_values):
+        identifier, check = normalise(value)
+        clp_info.append({"id": first_id + i, **{key: "-" for key in KEY_NAMES}, "Input": identifier,
+                         "Input check": check})
+    return clp_info
+
+
+def load_indexes(source_files, parsed_cache=None, metrics=None):
+    """Index every available source file. ``source_files`` maps source name -> file or None."""
+    indexes = {}
+    for spec in SOURCES:
+        if source_files.get(spec.name):
+            with _stage(metrics, "parse", spec.name) as details:
+                if parsed_cache:
+                    indexes[spec.name] = parsed_cache.load_index(spec, source_files[spec.name])
+                else:
+                    indexes[spec.name] = build_index(spec, source_files[spec.name])
+                details["rows"] = len(indexes[spec.name])
+            logging.info(f"{spec.label} list loaded successfully")
+        else:
+            logging.info(f"No {spec.label} database")
+    return indexes
+
+
+def _stage(metrics, stage, source=None):
+    return metrics.stage(stage, source) if metrics else nullcontext({})
+
+
+def screen_record(entry, indexes, timings=None, hits="first", crosswalk=None):
+    """Check one substance record against all loaded source lists.
+
+    ``timings`` (source name -> seconds) accumulates the time spent per source.
+    ``hits`` is one of HIT_MODES (see ``apply_match``). With a ``crosswalk``
+    the record is also matched on the partner CAS/EC numbers of its own.
+    """
+    # ECHA-CHEM C&L
+    if entry.get("Input check") == VALID_EC:
+        entry["EC"] = entry["Input"]
+    elif entry.get("Input check") != NAME_INPUT:  # Name inputs come with the CAS/EC of their name match
+        entry["CAS"] = entry["Input"]
+    partners = crosswalk.resolve(entry) if crosswalk else ()
+
+    # Check all source lists (PPP ED, ECHA ED, SVHC, SVHC intent, PACT, CoRAP, BPR ED, food lists)
+    for spec in SOURCES:
+        if spec.name in indexes:
+            if timings is None:
+                apply_match(entry, indexes[spec.name], hits, partners)
+            else:
+                started = time.perf_counter()
+                apply_match(entry, indexes[spec.name], hits, partners)
+                timings[spec.name] = timings.get(spec.name, 0.0) + time.perf_counter() - started
+    return entry
+
+
+def screen_records(clp_info, indexes, screened=None, progress=None, metrics=None, hits="first", crosswalk=None):
+    """Screen all records, each unique input only once.
+
+    ``screened`` maps input -> screened record and can be shared between calls
+    (e.g. the chunks of a batch run). ``progress(done, total, entry)`` is called
+    after every record. With ``metrics`` the match time per source is recorded.
+    ``hits`` says how several matching rows of a list are reported (HIT_MODES).
+    ``crosswalk`` (see ``crosswalk.Crosswalk``) adds the partner CAS/EC numbers.
+    """
+    screened = {} if screened is None else screened
+    timings = {} if metrics else None
+    N_CAS = len(clp_info)
+    unique = 0
+    with _stage(metrics, "screen") as details:
+        for i, entry in enumerate(clp_info):
+            first = screened.get(entry["Input"])
+            if first is None:
+                screened[entry["Input"]] = screen_record(entry, indexes, timings, hits, crosswalk)
+                unique += 1
+            else:
+                # Duplicate input: copy the results, keep this row's own id
+                entry.update({key: value for key, value in first.items() if key != "id"})
+            if progress:
+                progress(i + 1, N_CAS, entry)
+        details.update(rows=N_CAS, unique=unique)
+    if metrics:
+        for name, seconds in timings.items():
+            metrics.add("match", name, seconds, rows=unique)
+    return clp_info
@@ -0,0 +1,228 @@
+"""Local HTTP/JSON service for screening a few substances at a time.
+
+    python -m edscreener.service --port 8765 --bpr BPR.xlsx --food-additives food_add.xlsx \
+        --food-flavourings food_flav.xlsx
+
+The source lists are downloaded (or taken from ``--offline``) and indexed once
+when the service starts and then kept in memory, so a lookup is a handful of
+dictionary lookups instead of a full run:
+
+* ``GET /screen?cas=50-00-0&cas=200-001-8`` (also ``name=`` for substance names,
+  ``hits=first|joined|long``)
+* ``POST /screen`` with ``{"cas": [...], "name": [...], "hits": "first"}`` or a
+  plain JSON list of CAS/EC numbers; "cas" and "name" also take a single value
+* ``GET /health``: loaded lists, row counts, load time and snapshot manifest
+
+Every result has the columns of the results workbook (``KEY_NAMES``). The
+lists are reloaded in the background every ``--refresh-hours``; requests keep
+using the previous lists until the new ones are completely indexed, then the
+service switches over in one step.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import parse_qs, urlparse
+
+from edscreener.cli import load_sources
+from edscreener.crosswalk import Crosswalk
+from edscreener.names import NameIndex, name_records
+from edscreener.screening import KEY_NAMES, new_records, screen_records
+from edscreener.snapshots import DEFAULT_TTL
+from edscreener.sources import HIT_MODES, HITS_KEY
+
+DEFAULT_PORT = 8765
+# Largest request body and number of substances per request
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_BATCH = 10000
+
+
+class LoadedSources(NamedTuple):
+    indexes: dict
+    name_index: NameIndex
+    crosswalk: Crosswalk
+    manifest: dict
+    loaded: str
+
+
+def request_values(value, field):
+    """The values of one field of a POST body: a list, or a single string or number."""
+    if value is None:
+        return []
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return [value]
+    if isinstance(value, list):
+        return value
+    raise ValueError(f'"{field}" must be a list or a single value')
+
+
+def result(record):
+    """The results columns of a screened record, with every hit under "All hits" in long mode."""
+    values = {key: record.get(key) for key in KEY_NAMES}
+    if HITS_KEY in record:
+        values["All hits"] = [{"source": source, "hit": number, "values": row}
+                              for source, number, row in record[HITS_KEY]]
+    return values
+
+
+class LookupService:
+    def __init__(self, load, refresh_interval=DEFAULT_TTL):
+        self.load = load  # () -> (indexes, manifest text)
+        self.refresh_interval = refresh_interval  # Seconds
+        self.sources = None
+        self._stop = threading.Event()
+        self.refresh()
+
+    def refresh(self):
+        """Load and index the lists, then replace the ones in use in one step."""
+        started = time.perf_counter()
+        indexes, manifest = self.load()
+        self.sources = LoadedSources(indexes, NameIndex(indexes), Crosswalk(indexes), json.loads(manifest),
+                                     datetime.now().isoformat(timespec="seconds"))
+        logging.info(f"Service lists loaded in {time.perf_counter() - started:.1f} s: "
+                     f"{', '.join(f'{name} ({len(index)})' for name, index in indexes.items())}")
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                # Keep answering with the lists we have
+                logging.exception("Refreshing the source lists failed")
+
+    def start_refresh(self):
+        if self.refresh_interval:
+            threading.Thread(target=self._refresh_loop, name="source-refresh", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def screen(self, values=(), names=(), hits="first"):
+        """Screen CAS/EC numbers and substance names; one result per value, in order."""
+        if hits not in HIT_MODES:
+            raise ValueError(f"Unknown hits mode: {hits}")
+        if len(values) + len(names) > MAX_BATCH:
+            raise ValueError(f"At most {MAX_BATCH} substances per request")
+        sources = self.sources  # A refresh replaces the whole tuple, never parts of it
+        records = new_records(values)
+        if names:
+            records += name_records(names, sources.name_index, first_id=len(records) + 1)
+        screen_records(records, sources.indexes, hits=hits, crosswalk=sources.crosswalk)
+        return [result(record) for record in records]
+
+    def health(self):
+        sources = self.sources
+        return {"loaded": sources.loaded, "rows": {name: len(index) for name, index in sources.indexes.items()},
+                "names": len(sources.name_index), "crosswalk": len(sources.crosswalk),
+                "snapshots": sources.manifest}
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT):
+    """HTTP server answering /screen and /health from ``service`` (not started yet)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so a client can send many lookups over one connection
+        disable_nagle_algorithm = True  # Headers and body go out at once, no delayed-ACK stall per response
+
+        def log_message(self, format, *args):
+            logging.debug(f"{self.address_string()} {format % args}")
+
+        def _send(self, status, data):
+            body = json.dumps(data, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _screen(self, values, names, hits):
+            try:
+                self._send(200, service.screen(values, names, hits))
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/screen":
+                self._screen(query.get("cas", []), query.get("name", []), query.get("hits", ["first"])[0])
+            elif url.path == "/health":
+                self._send(200, service.health())
+            else:
+                self._send(404, {"error": "Not found"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                if length < 0:
+                    raise ValueError
+            except ValueError:
+                self.close_connection = True  # The body cannot be skipped without its length
+                self._send(400, {"error": "Invalid Content-Length header"})
+                return
+            if urlparse(self.path).path != "/screen":
+                self.rfile.read(length)
+                self._send(404, {"error": "Not found"})
+                return
+            if length > MAX_BODY_BYTES:
+                self.close_connection = True
+                self._send(413, {"error": "Request body too large"})
+                return
+            try:
+                request = json.loads(self.rfile.read(length) or b"null")
+            except ValueError:
+                self._send(400, {"error": "Body is not valid JSON"})
+                return
+            if isinstance(request, list):
+                request = {"cas": request}
+            if not isinstance(request, dict):
+                self._send(400, {"error": 'Expected a list of CAS numbers or {"cas": [...], "name": [...]}'})
+                return
+            try:
+                values = request_values(request.get("cas"), "cas")
+                names = [str(name) for name in request_values(request.get("name"), "name")]
+            except ValueError as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._screen(values, names, request.get("hits", "first"))
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="edscreener.service",
+                                     description="Answer single-substance screening requests over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--bpr", help="BPR ED workbook")
+    parser.add_argument("--food-additives", help="food additives workbook")
+    parser.add_argument("--food-flavourings", help="food flavourings workbook")
+    parser.add_argument("--offline", help="results package (zip) or folder whose source lists are used "
+                                          "instead of downloading")
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL / 3600,
+                        help="reuse downloaded source lists for this many hours")
+    parser.add_argument("--refresh-hours", type=float, default=DEFAULT_TTL / 3600,
+                        help="reload the source lists in the background this often (0: never)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    service = LookupService(lambda: load_sources(args), args.refresh_hours * 3600)
+    service.start_refresh()
+    server = make_server(service, args.host, args.port)
+    logging.info(f"Screening service listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
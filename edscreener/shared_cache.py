@@ -0,0 +1,103 @@
+"""In-memory cache of downloaded and parsed source lists, shared by all sessions of a process.
+
+The Streamlit app creates one ``SharedCache`` per server process, so users
+screening at the same time share one download of the ECHA/EFSA lists and one
+parsed index per list. Downloads are shared through the snapshot files on
+disk, not held in memory. Indexes are keyed by the hash of the workbook bytes,
+which also covers uploads: the same BPR or food workbook uploaded again (by
+anyone) is not parsed again.
+
+Entries expire after a TTL and the least recently used ones are evicted when
+the estimated size of all entries passes a memory cap. Concurrent requests for
+the same entry wait for the first one instead of downloading or parsing twice.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from edscreener.downloads import download_sources
+from edscreener.parsed_cache import ParsedCache, content_digest, spec_fingerprint
+from edscreener.snapshots import DEFAULT_TTL
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get("EDSCREENER_SHARED_CACHE_MB", 1024)) * 1024 * 1024)
+# Keys share a fixed set of locks, so the locks do not pile up with every workbook ever cached
+LOCK_STRIPES = 64
+
+
+def estimate_index_size(index):
+    """Rough memory use of a SourceIndex in bytes."""
+    size = sys.getsizeof(index.rows) + sys.getsizeof(index.keys)
+    size += sum(sys.getsizeof(row_numbers) for row_numbers in index.keys.values())
+    for row in index.rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values())
+    for identifiers in index.identifiers:
+        size += sys.getsizeof(identifiers) + sum(sys.getsizeof(identifier) for identifier in identifiers)
+    size += sum(sys.getsizeof(name) for name in index.names)
+    return size
+
+
+class SharedCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, parsed_cache=None):
+        self.ttl = ttl  # Seconds
+        self.max_bytes = max_bytes
+        self.parsed_cache = parsed_cache or ParsedCache()
+        self._entries = OrderedDict()  # Key -> (value, size, created), least recently used first
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]  # create() must not call get()
+
+    def get(self, key, create, size=None, ttl=None):
+        """Return the cached value for ``key``, calling ``create()`` if it is missing or expired."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._key_locks[hash(key) % LOCK_STRIPES]:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry and time.time() - entry[2] <= ttl:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+            value = create()
+            value_size = size(value) if size else sys.getsizeof(value)
+            with self._lock:
+                self._entries[key] = (value, value_size, time.time())
+                self._entries.move_to_end(key)
+                self._evict()
+            return value
+
+    def _evict(self):
+        total = sum(size for _, size, _ in self._entries.values())
+        # Always keep the newest entry, even if it is larger than the cap on its own
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, (_, size, _) = self._entries.popitem(last=False)
+            total -= size
+            logging.info(f"Shared cache: evicted {key[0]} ({size / 1e6:.1f} MB)")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        logging.info("Shared cache cleared")
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries),
+                    "megabytes": round(sum(size for _, size, _ in self._entries.values()) / 1e6, 1)}
+
+    def load_index(self, spec, workbook_file):
+        """SourceIndex of a workbook, shared by content hash (same interface as ParsedCache)."""
+        digest = content_digest(workbook_file)
+        return self.get(("index", spec.name, spec_fingerprint(spec), digest),
+                        lambda: self.parsed_cache.load_index(spec, workbook_file), size=estimate_index_size)
+
+    def download_sources(self, snapshot_cache, ttl=None, metrics=None):
+        """Downloaded source lists (source -> binary file or None) and the snapshot manifest."""
+        def create():
+            downloaded = download_sources(snapshot_cache, metrics=metrics)
+            for content in downloaded.values():
+                if content is not None:
+                    content.close()  # Every download is in the snapshot folder now
+            return {source: content is not None for source, content in downloaded.items()}, snapshot_cache.manifest()
+
+        available, manifest = self.get(("downloads",), create, ttl=ttl)
+        # Every caller gets its own handles on the snapshot files
+        return {source: snapshot_cache.open(source) if ok else None for source, ok in available.items()}, manifest
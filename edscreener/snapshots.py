@@ -0,0 +1,125 @@
+"""On-disk snapshot cache for the downloaded source lists.
+
+Each source is stored as ``<source>.xlsx`` with a ``<source>.json`` file next to
+it that records where and when it was fetched, its size and hash, and the
+ETag/Last-Modified validators returned by the portal. Within the TTL a snapshot
+is used without any network traffic; after that the download is revalidated
+with a conditional request where the portal supports it.
+
+Snapshots are written and handed out as files, never read into memory whole.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+
+from edscreener.files import atomic_path
+
+DEFAULT_FOLDER = os.environ.get("EDSCREENER_CACHE_DIR", os.path.join(os.getcwd(), "databases", "snapshots"))
+DEFAULT_TTL = float(os.environ.get("EDSCREENER_SNAPSHOT_TTL_HOURS", 24)) * 3600
+
+
+class SnapshotCache:
+    def __init__(self, folder=None, ttl=DEFAULT_TTL):
+        self.folder = folder or DEFAULT_FOLDER
+        self.ttl = ttl  # Seconds, 0 always revalidates
+        self.used = {}  # Source -> metadata of the snapshot used in this run
+        os.makedirs(self.folder, exist_ok=True)
+
+    def _paths(self, source):
+        base = os.path.join(self.folder, source)
+        return base + ".xlsx", base + ".json"
+
+    def metadata(self, source):
+        """Return the stored metadata of a source, or None if it was never fetched."""
+        data_path, meta_path = self._paths(source)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def is_fresh(self, meta):
+        return meta is not None and time.time() - meta["fetched_at"] < self.ttl
+
+    def open(self, source):
+        """The snapshot of a source as an open binary file."""
+        data_path, _ = self._paths(source)
+        return open(data_path, "rb")
+
+    def conditional_headers(self, meta):
+        """Validators for a conditional request, empty if the portal sent none."""
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def store(self, source, content, url, response_headers=None):
+        """Save a freshly downloaded snapshot and return its metadata.
+
+        ``content`` is a binary file (see ``downloads.stream_to_file``) or bytes;
+        a file is copied in blocks and left at its start.
+        """
+        response_headers = response_headers or {}
+        data_path, meta_path = self._paths(source)
+        if isinstance(content, (bytes, bytearray)):
+            size, digest = len(content), hashlib.sha256(content).hexdigest()
+            self._write(data_path, content)
+        else:
+            size, digest = self._copy(data_path, content)
+        meta = {
+            "source": source,
+            "url": url,
+            "fetched_at": time.time(),
+            "fetched": datetime.now().isoformat(timespec="seconds"),
+            "size": size,
+            "sha256": digest,
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+        }
+        self._write(meta_path, json.dumps(meta, indent=2).encode("utf-8"))
+        self.used[source] = meta
+        return meta
+
+    def touch(self, source, meta):
+        """Mark a snapshot as revalidated (the portal answered 304 Not Modified)."""
+        meta = dict(meta, fetched_at=time.time(), revalidated=datetime.now().isoformat(timespec="seconds"))
+        _, meta_path = self._paths(source)
+        self._write(meta_path, json.dumps(meta, indent=2).encode("utf-8"))
+        self.used[source] = meta
+        return meta
+
+    def use(self, source, meta):
+        """Record that a cached snapshot was used as-is."""
+        self.used[source] = meta
+        logging.info(f"Using cached {source} snapshot from {meta['fetched']} ({meta['size']} bytes)")
+        return meta
+
+    def manifest(self):
+        """Metadata of every snapshot used in this run, for the results package."""
+        return json.dumps(self.used, indent=2)
+
+    @staticmethod
+    def _write(path, content):
+        # Write to a temporary file first so a crash never leaves half a snapshot
+        with atomic_path(path) as tmp_path, open(tmp_path, "wb") as f:
+            f.write(content)
+
+    @staticmethod
+    def _copy(path, content):
+        # Same as _write for a file; returns (size, sha256), taken from the download when it has them
+        content.seek(0)
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(content, f)
+                size = f.tell()
+            content.seek(0)
+            digest = getattr(content, "sha256", None)
+            if digest is None:
+                digest = hashlib.file_digest(content, "sha256").hexdigest()
+                content.seek(0)
+        return size, digest
@@ -0,0 +1,347 @@
+"""Regulatory source lists and their CAS/EC lookup indexes.
+
+Every list is parsed once per run into a ``SourceIndex``. Identifier cells are
+tokenised once ("50-00-0; 200-001-8", odd dashes and non-breaking spaces
+included) and the index maps each identifier to every row it occurs in, so
+checking a substance is a dictionary lookup instead of a scan over every cell
+of the workbook, and a substance listed several times finds all its rows.
+
+Workbooks are read in a single streaming pass (read-only, values only). The
+columns we need are found by their header text, so a reordered export still
+fills the right results columns. The historic column letters are only used
+when a header cannot be found, and that is logged. openpyxl is only imported
+when a workbook is actually parsed.
+"""
+import logging
+import re
+from datetime import date, datetime
+from dataclasses import dataclass
+from typing import NamedTuple
+
+from edscreener.identifiers import DASHES, cas_checksum_ok
+
+# Inputs are reduced to digits and hyphens, so only such cells can ever match
+IDENTIFIER_PATTERN = re.compile(r"[\d\-]+")
+# Hyphenated numbers inside a cell (CAS, EC, list numbers), whitespace (incl.
+# non-breaking) around the hyphens allowed, e.g. "50 - 00 - 0"
+IDENTIFIER_TOKEN = re.compile(r"\d+(?:\s*-\s*\d+)+")
+# Digit groups of one CAS (50-00-0) or EC (200-001-8) number
+IDENTIFIER_SHAPES = (re.compile(r"\d{2,7}-\d{2}-\d"), re.compile(r"\d{3}-\d{3}-\d"))
+# Bump when build_index changes what it extracts, so cached parses are rebuilt
+PARSER_VERSION = 5
+# How matches are reported: first row only, values of all rows joined, or all rows on an extra sheet
+HIT_MODES = ("first", "joined", "long")
+# Separates the values of several matching rows in "joined" mode
+HIT_SEPARATOR = " | "
+# Record key holding every matching row in "long" mode (not a results column)
+HITS_KEY = "_hits"
+# The header row is looked for in the first rows of the sheet (title rows come first in some lists)
+HEADER_SEARCH_ROWS = 20
+# Header texts of the identifier columns
+CAS_HEADERS = ("cas",)
+EC_HEADERS = ("ec", "ec list")
+# Header texts of the substance name column, most specific first
+NAME_HEADERS = ("substance name", "name", "active substance")
+
+
+class Column(NamedTuple):
+    headers: tuple  # Header texts to look for, most specific first
+    letter: str  # Historic position, used if none of the headers is found
+    offset: int = 0  # Take the column this far right of the header (e.g. the link next to a status)
+
+
+@dataclass
+class SourceSpec:
+    name: str  # Short key used for the index, e.g. "PPP"
+    label: str  # Used in log messages
+    flag: str  # Yes/No column in the results
+    fields: dict  # Results column -> Column in the source sheet
+    sheet: str = None  # Sheet name, first sheet if None
+    prefixes: dict = None  # Results column -> text put in front of the value
+
+
+SOURCES = [
+    SourceSpec("PPP", "PPP", "ED PPP: Yes/No", {
+        "ED PPP: Status": Column(("ed assessment status", "status"), "H"),
+        "ED PPP: Conclusion HH": Column(("conclusion hh", "conclusion human health", "human health"), "I"),
+        "ED PPP: Conclusion non-TO": Column(("conclusion non to", "non target organisms", "non target"), "J"),
+        "ED PPP: EFSA conclusion link": Column(("efsa conclusion link", "efsa conclusion", "link"), "N"),
+    }),
+    SourceSpec("EDass", "ECHA ED", "ED Assessment List: Yes/No", {
+        "ED Assessment List: Outcome": Column(("outcome", "conclusion"), "G"),
+        "ED Assessment List: Status": Column(("status",), "F"),
+        "ED Assessment List: Authority": Column(("authority", "submitter"), "E"),
+        "ED Assessment List: Last updated": Column(("last updated", "latest update"), "H"),
+    }),
+    SourceSpec("SVHC", "SVHC", "SVHC: Yes/No", {
+        "SVHC: Reason": Column(("reason for inclusion", "reason"), "E"),
+        "SVHC: Date Inclusion": Column(("date of inclusion", "inclusion date"), "I"),
+        "SVHC: Decision": Column(("decision",), "J"),
+    }),
+    SourceSpec("SVHCintent", "SVHC intent", "SVHC intent: Yes/No", {
+        "SVHC intent: Status": Column(("status",), "G"),
+        "SVHC intent: Scope": Column(("scope", "hazard detailed concern"), "N"),
+        "SVHC intent: Last updated": Column(("last updated", "latest update"), "AA"),
+    }),
+    SourceSpec("PACT", "PACT", "PACT: Yes/No", {
+        "PACT: SEv": Column(("substance evaluation", "corap"), "E"),
+        "PACT: SEv link": Column(("substance evaluation", "corap"), "F", 1),
+        "PACT: DEv": Column(("dossier evaluation",), "I"),
+        "PACT: DEv link": Column(("dossier evaluation",), "J", 1),
+        "PACT: ED": Column(("ed assessment", "endocrine disruptor assessment"), "K"),
+        "PACT: ED link": Column(("ed assessment", "endocrine disruptor assessment"), "L", 1),
+        "PACT: ARN": Column(("assessment of regulatory needs", "arn"), "M"),
+        "PACT: ARN link": Column(("assessment of regulatory needs", "arn"), "N", 1),
+        "PACT: PBT": Column(("pbt assessment", "pbt"), "G"),
+        "PACT: PBT link": Column(("pbt assessment", "pbt"), "H", 1),
+        "PACT: CLH": Column(("harmonised classification and labelling", "clh"), "O"),
+        "PACT: CLH link": Column(("harmonised classification and labelling", "clh"), "P", 1),
+        "PACT: SVHC": Column(("svhc identification", "svhc"), "Q"),
+        "PACT: SVHC link": Column(("svhc identification", "svhc"), "R", 1),
+    }),
+    SourceSpec("CoRAP", "CoRAP", "CoRAP: Yes/No", {
+        "CoRAP: Initial grounds of Concern": Column(("initial grounds for concern", "grounds for concern"), "H"),
+        "CoRAP: Status": Column(("status",), "I"),
+        "CoRAP: Latest update": Column(("latest update", "last updated"), "J"),
+    }),
+    SourceSpec("BPR", "BPR ED", "BPR: Yes/No", {
+        "BPR: ED HH": Column(("meets ed criteria hh",), "K"),
+        "BPR: ED ENV": Column(("meets ed criteria env",), "L"),
+    }, sheet="List of active substances"),
+    SourceSpec("food_add", "Food additives", "Food additive: Yes/No", {
+        "Food additive: E number": Column(("e number",), "B"),
+    }, sheet="List for EDscreener"),
+    SourceSpec("food_flav", "Food flavourings", "Food flavourings: Yes/No", {
+        "Food flavourings: FL": Column(("fl no",), "A"),
+    }, sheet="List for EDscreener", prefixes={"Food flavourings: FL": "FL "}),
+]
+SOURCES_BY_NAME = {spec.name: spec for spec in SOURCES}
+
+
+class SourceIndex:
+    """Rows of one source list, indexed by every CAS/EC identifier they contain."""
+
+    def __init__(self, spec, rows, identifiers, names=None):
+        self.spec = spec
+        self.rows = rows  # One dict per source row: results column -> value
+        self.identifiers = identifiers  # Identifiers found in each row
+        self.names = names or []  # Substance name per row (None if empty), for name screening
+        self.keys = {}  # Identifier -> numbers of all rows containing it, in sheet order
+        for row_number, row_identifiers in enumerate(identifiers):
+            for identifier in row_identifiers:
+                row_numbers = self.keys.setdefault(identifier, [])
+                if not row_numbers or row_numbers[-1] != row_number:
+                    row_numbers.append(row_number)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, *identifiers):
+        """Return the index of the first row matching any of the identifiers, or None."""
+        hits = [self.keys[ident][0] for ident in identifiers if ident and ident != "-" and ident in self.keys]
+        return min(hits) if hits else None
+
+    def lookup_all(self, *identifiers):
+        """Return the indexes of all rows matching any of the identifiers, in sheet order."""
+        hits = set()
+        for ident in identifiers:
+            if ident and ident != "-" and ident in self.keys:
+                hits.update(self.keys[ident])
+        return sorted(hits)
+
+
+def identifier_tokens(value):
+    """All identifiers in one cell: "50-00-0; 200-001-8" -> ["50-00-0", "200-001-8"].
+
+    Dash look-alikes become hyphens and whitespace around hyphens is dropped.
+    Hyphenated numbers that run together are split into their CAS/EC numbers
+    first, so a pair "50-00-0 - 50-00-1" or a range "200-001-8–200-003-4"
+    gives both numbers; other hyphenated numbers (index numbers) stay whole.
+    A cell holding nothing but digits (and spaces) is one identifier, written
+    as a CAS number when it has a valid CAS check digit ("7440020" ->
+    "7440-02-0"), as the inputs are.
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip().translate(_DASH_TABLE)
+    tokens = []
+    for run in IDENTIFIER_TOKEN.findall(text):
+        tokens.extend(_split_run("".join(run.split())))
+    if not tokens:
+        compact = "".join(text.split())
+        if compact.isdigit() and 5 <= len(compact) <= 10:
+            cas = f"{compact[:-3]}-{compact[-3:-1]}-{compact[-1]}"
+            tokens.append(cas if cas_checksum_ok(cas) else compact)
+        elif compact != "-" and IDENTIFIER_PATTERN.fullmatch(compact):
+            tokens.append(compact)
+    return list(dict.fromkeys(tokens))
+
+
+def _split_run(run):
+    # "50-00-0-50-00-1" -> ["50-00-0", "50-00-1"]; the whole run unless every
+    # three groups make a CAS or EC number
+    groups = run.split("-")
+    if len(groups) > 3 and len(groups) % 3 == 0:
+        numbers = ["-".join(groups[i:i + 3]) for i in range(0, len(groups), 3)]
+        if all(any(shape.fullmatch(number) for shape in IDENTIFIER_SHAPES) for number in numbers):
+            return numbers
+    return [run]
+
+
+_DASH_TABLE = str.maketrans({dash: "-" for dash in DASHES})
+
+
+def _normalise_header(value):
+    # "CAS  No." -> " cas no ", "EC_number" -> " ec number "
+    return " " + re.sub(r"[^a-z0-9]+", " ", str(value).lower()).strip() + " "
+
+
+def _find_column(headers, candidates):
+    for candidate in candidates:
+        for position, header in enumerate(headers):
+            if f" {candidate} " in header:
+                return position
+    return None
+
+
+def resolve_columns(spec, header_values):
+    """Map the results columns and identifier columns of a spec onto header positions.
+
+    Returns (field positions, identifier positions, name position or None).
+    Fields whose header is missing fall back to their historic letter, with a
+    warning.
+    """
+    from openpyxl.utils import column_index_from_string
+
+    headers = [_normalise_header(value) if value is not None else "" for value in header_values]
+    positions, missing = {}, []
+    for column, source_column in spec.fields.items():
+        position = _find_column(headers, source_column.headers)
+        if position is None:
+            missing.append(column)
+            positions[column] = column_index_from_string(source_column.letter) - 1
+        else:
+            positions[column] = position + source_column.offset
+    if missing:
+        logging.warning(f"{spec.label} list: no header found for {', '.join(missing)}, using fixed columns")
+
+    identifier_positions = [position for position, header in enumerate(headers)
+                            if any(f" {candidate} " in header for candidate in CAS_HEADERS + EC_HEADERS)]
+    return positions, identifier_positions, _find_column(headers, NAME_HEADERS)
+
+
+def build_index(spec, workbook_file):
+    """Parse a source workbook in one streaming pass and index it by its identifier cells."""
+    import openpyxl
+    from openpyxl.utils import column_index_from_string
+
+    workbook = openpyxl.load_workbook(workbook_file, read_only=True, data_only=True)
+    try:
+        sheet = workbook[spec.sheet] if spec.sheet else workbook.worksheets[0]
+        rows_iter = sheet.iter_rows(values_only=True)
+
+        # Look for the header row (the first row naming a CAS column)
+        leading_rows, header_values = [], None
+        for values in rows_iter:
+            if any(value is not None and " cas " in _normalise_header(value) for value in values):
+                header_values = values
+                break
+            leading_rows.append(values)
+            if len(leading_rows) >= HEADER_SEARCH_ROWS:
+                break
+
+        if header_values is not None:
+            positions, identifier_positions, name_position = resolve_columns(spec, header_values)
+            data_rows = rows_iter
+        else:
+            # No recognisable header: historic layout, identifiers may be in any cell
+            logging.warning(f"{spec.label} list: header row not found, using fixed columns")
+            positions = {column: column_index_from_string(source_column.letter) - 1
+                         for column, source_column in spec.fields.items()}
+            identifier_positions = name_position = None
+            data_rows = _chain(leading_rows, rows_iter)
+
+        rows, identifiers, names = [], [], []
+        for values in data_rows:
+            rows.append({column: values[pos] if pos < len(values) else None for column, pos in positions.items()})
+            if name_position is not None:
+                name = values[name_position] if name_position < len(values) else None
+                names.append(str(name).strip() if name is not None else None)
+            if identifier_positions is None:
+                identifier_values = [value for value in values if value is not None]
+            else:
+                identifier_values = [values[pos] for pos in identifier_positions
+                                     if pos < len(values) and values[pos] is not None]
+            row_identifiers = []
+            for value in identifier_values:
+                if not isinstance(value, (datetime, date)):
+                    row_identifiers.extend(identifier_tokens(value))
+            identifiers.append(list(dict.fromkeys(row_identifiers)))
+    finally:
+        workbook.close()
+
+    index = SourceIndex(spec, rows, identifiers, names)
+    logging.info(f"{spec.label} list indexed: {len(rows)} rows, {len(index.keys)} identifiers")
+    return index
+
+
+def _chain(first_rows, rest):
+    yield from first_rows
+    yield from rest
+
+
+def _field_value(spec, column, value):
+    # The prefix only goes in front of a real value, an empty cell stays empty
+    if spec.prefixes and column in spec.prefixes and not is_missing(value) and str(value).strip():
+        return spec.prefixes[column] + str(value)
+    return value
+
+
+def is_missing(value):
+    """True for None, NaN and NaT (pd.isna for one value, without importing pandas)."""
+    return value is None or value != value
+
+
+def _joined_text(value):
+    if value is None:
+        return "-"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+def apply_match(entry, index, hits="first", identifiers=()):
+    """Fill the columns of one source for a substance record. Returns True if found.
+
+    The record is matched on its CAS, EC and input, plus any other
+    ``identifiers`` (the partner numbers from the crosswalk).
+
+    ``hits`` (one of HIT_MODES) says what happens when several rows match:
+    "first" reports the first row, "joined" the values of all rows separated
+    by HIT_SEPARATOR, "long" the first row plus all rows under HITS_KEY.
+    """
+    spec = index.spec
+    if hits == "first":
+        row_number = index.lookup(entry["CAS"], entry["EC"], entry["Input"], *identifiers)
+        row_numbers = [] if row_number is None else [row_number]
+    else:
+        row_numbers = index.lookup_all(entry["CAS"], entry["EC"], entry["Input"], *identifiers)
+    if not row_numbers:
+        entry[spec.flag] = "No"
+        return False
+
+    entry[spec.flag] = "Yes"
+    if hits == "joined" and len(row_numbers) > 1:
+        for column in spec.fields:
+            entry[column] = HIT_SEPARATOR.join(
+                _joined_text(_field_value(spec, column, index.rows[row_number][column])) for row_number in row_numbers)
+        return True
+
+    for column, value in index.rows[row_numbers[0]].items():
+        entry[column] = _field_value(spec, column, value)
+    if hits == "long":
+        entry.setdefault(HITS_KEY, []).extend(
+            (spec.label, number, {column: _field_value(spec, column, value)
+                                  for column, value in index.rows[row_number].items()})
+            for number, row_number in enumerate(row_numbers, start=1))
+    return True
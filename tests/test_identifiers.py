@@ -0,0 +1,56 @@
+"""CAS/EC check digits and the normalisation of raw input values."""
+from datetime import datetime
+
+import pytest
+
+from edscreener.identifiers import (INVALID_CHECKSUM, INVALID_DATE, INVALID_FORMAT, VALID_CAS, VALID_EC,
+                                    cas_checksum_ok, ec_checksum_ok, normalise)
+
+
+@pytest.mark.parametrize("cas, ok", [
+    ("50-00-0", True),
+    ("7732-18-5", True),
+    ("7440-02-0", True),
+    ("1234567-89-5", True),
+    ("50-00-1", False),
+    ("7732-18-4", False),
+    ("50000", False),  # Not in CAS form
+    ("200-001-8", False),  # EC shape, second group too long for a CAS number
+])
+def test_cas_checksum(cas, ok):
+    assert cas_checksum_ok(cas) is ok
+
+
+@pytest.mark.parametrize("ec, ok", [
+    ("200-001-8", True),
+    ("231-791-2", True),
+    ("200-001-9", False),
+    ("231-791-0", False),
+    ("50-00-0", False),
+])
+def test_ec_checksum(ec, ok):
+    assert ec_checksum_ok(ec) is ok
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("50-00-0", ("50-00-0", VALID_CAS)),
+    (" 50–00–0\t", ("50-00-0", VALID_CAS)),
+    ("50 - 00 - 0", ("50-00-0", VALID_CAS)),
+    ("0050-00-0", ("50-00-0", VALID_CAS)),
+    (50000, ("50-00-0", VALID_CAS)),
+    (50000.0, ("50-00-0", VALID_CAS)),
+    ("50000.0", ("50-00-0", VALID_CAS)),
+    ("7440020", ("7440-02-0", VALID_CAS)),
+    ("200-001-8", ("200-001-8", VALID_EC)),
+    ("7732-18-4", ("7732-18-4", INVALID_CHECKSUM)),
+    ("200-001-9", ("200-001-9", INVALID_CHECKSUM)),
+    ("1234", ("1234", INVALID_FORMAT)),
+    ("Formaldehyde", ("", INVALID_FORMAT)),
+])
+def test_normalise(value, expected):
+    assert normalise(value) == expected
+
+
+def test_normalise_flags_excel_dates():
+    identifier, check = normalise(datetime(2000, 5, 1))
+    assert check == INVALID_DATE
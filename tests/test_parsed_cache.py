@@ -0,0 +1,46 @@
+"""A warm read from the parsed cache gives exactly the rows of a cold parse."""
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+from benchmarks.synthetic import cas_number, ec_number, source_layout
+from edscreener import parsed_cache
+from edscreener.parsed_cache import ParsedCache, content_digest
+from edscreener.sources import SOURCES, build_index
+
+# Cell values of every type a list can hold, mixed within columns and with gaps
+VALUES = [datetime(2024, 1, 2), "Under assessment", 5, None, 1001, 2.5, True, "2024-01-02"]
+
+
+def write_workbook(spec, path, rows=24):
+    headers, fields = source_layout(spec)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(spec.sheet or "Export")
+    ws.append(headers)
+    for row in range(rows):
+        ws.append([f"Substance {row}", ec_number(row), cas_number(row)]
+                  + [VALUES[(row + column) % len(VALUES)] for column in range(len(fields) - 3)])
+    wb.save(path)
+
+
+@pytest.mark.parametrize("cache_format", ["parquet", "pkl"])
+@pytest.mark.parametrize("spec", SOURCES, ids=lambda spec: spec.name)
+def test_warm_read_matches_cold_parse(spec, cache_format, tmp_path, monkeypatch):
+    if cache_format == "parquet":
+        pytest.importorskip("pyarrow")
+    monkeypatch.setattr(parsed_cache, "FORMAT", cache_format)
+    path = tmp_path / f"{spec.name}.xlsx"
+    write_workbook(spec, path)
+    cold = build_index(spec, path)
+
+    cache = ParsedCache(str(tmp_path / "parsed"))
+    cache.load_index(spec, path)  # Parses and fills the cache
+    assert (tmp_path / "parsed" / cache.path(spec, content_digest(path))).exists()
+    warm = cache.load_index(spec, path)
+
+    assert warm.rows == cold.rows
+    assert [[type(value) for value in row.values()] for row in warm.rows] == \
+        [[type(value) for value in row.values()] for row in cold.rows]
+    assert warm.identifiers == cold.identifiers
+    assert warm.names == cold.names
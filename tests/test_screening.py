@@ -0,0 +1,55 @@
+"""Each unique input is screened once; duplicates get a copy of its results."""
+from edscreener import screening
+from edscreener.screening import new_records, screen_records
+from edscreener.sources import SOURCES_BY_NAME, SourceIndex
+
+SVHC = SOURCES_BY_NAME["SVHC"]
+
+
+def indexes():
+    rows = [{"SVHC: Reason": "ED", "SVHC: Date Inclusion": None, "SVHC: Decision": "D1"}]
+    return {"SVHC": SourceIndex(SVHC, rows, [["50-00-0"]])}
+
+
+def count_screens(monkeypatch):
+    inputs = []
+    screen_record = screening.screen_record
+
+    def counted(entry, *args, **kwargs):
+        inputs.append(entry["Input"])
+        return screen_record(entry, *args, **kwargs)
+
+    monkeypatch.setattr(screening, "screen_record", counted)
+    return inputs
+
+
+def test_duplicates_are_screened_once(monkeypatch):
+    screened_inputs = count_screens(monkeypatch)
+    # The same substance written three ways, and another one
+    records = new_records(["50-00-0", "50000", "7732-18-5", " 50–00–0"])
+    screen_records(records, indexes())
+
+    assert screened_inputs == ["50-00-0", "7732-18-5"]
+    assert [record["id"] for record in records] == [1, 2, 3, 4]
+    for duplicate in (records[1], records[3]):
+        assert {key: value for key, value in duplicate.items() if key != "id"} == \
+            {key: value for key, value in records[0].items() if key != "id"}
+    assert records[0][SVHC.flag] == "Yes" and records[0]["SVHC: Reason"] == "ED"
+    assert records[2][SVHC.flag] == "No"
+
+
+def test_screened_inputs_are_shared_between_calls(monkeypatch):
+    screened_inputs = count_screens(monkeypatch)
+    screened = {}
+    screen_records(new_records(["50-00-0"]), indexes(), screened)
+    second = screen_records(new_records(["50-00-0", "7732-18-5"], first_id=2), indexes(), screened)
+
+    assert screened_inputs == ["50-00-0", "7732-18-5"]
+    assert second[0]["id"] == 2 and second[0]["SVHC: Reason"] == "ED"
+
+
+def test_progress_counts_every_row():
+    calls = []
+    screen_records(new_records(["50-00-0", "50-00-0"]), indexes(),
+                   progress=lambda done, total, entry: calls.append((done, total)))
+    assert calls == [(1, 2), (2, 2)]
@@ -0,0 +1,92 @@
+"""Identifiers found in list cells, and how the records match them."""
+from datetime import datetime
+
+import pytest
+
+from edscreener.identifiers import normalise
+from edscreener.sources import HITS_KEY, SOURCES, SOURCES_BY_NAME, SourceIndex, apply_match, identifier_tokens
+
+SVHC = SOURCES_BY_NAME["SVHC"]
+
+
+@pytest.mark.parametrize("cell, tokens", [
+    ("50-00-0; 200-001-8", ["50-00-0", "200-001-8"]),
+    ("50-00-0 - 50-00-1", ["50-00-0", "50-00-1"]),
+    ("200-001-8–200-003-4", ["200-001-8", "200-003-4"]),
+    ("50 - 00 - 0", ["50-00-0"]),
+    ("50 ‑00 ‑0", ["50-00-0"]),
+    ("607-123-00-5", ["607-123-00-5"]),  # Index number, not a CAS/EC pair
+    ("7440020", ["7440-02-0"]),
+    (7440020, ["7440-02-0"]),
+    (7440020.0, ["7440-02-0"]),
+    ("7440021", ["7440021"]),  # Wrong check digit, left as it is
+    ("-", []),
+    ("Under assessment", []),
+])
+def test_identifier_tokens(cell, tokens):
+    assert identifier_tokens(cell) == tokens
+
+
+def test_bare_digit_cell_matches_hyphenated_input():
+    index = SourceIndex(SOURCES[0], [{}], [identifier_tokens("7440020")])
+    cas, _ = normalise("7440-02-0")
+    assert index.lookup(cas) == 0
+
+
+def svhc_index():
+    rows = [{"SVHC: Reason": "ED", "SVHC: Date Inclusion": datetime(2020, 1, 15), "SVHC: Decision": "D1"},
+            {"SVHC: Reason": "CMR", "SVHC: Date Inclusion": None, "SVHC: Decision": "D2"},
+            {"SVHC: Reason": "PBT", "SVHC: Date Inclusion": None, "SVHC: Decision": "D3"}]
+    return SourceIndex(SVHC, rows, [["50-00-0", "200-001-8"], ["50-00-0"], ["7732-18-5"]])
+
+
+def record(cas="-", ec="-"):
+    return {"Input": cas if cas != "-" else ec, "CAS": cas, "EC": ec}
+
+
+def test_apply_match_first_row():
+    entry = record("50-00-0")
+    assert apply_match(entry, svhc_index()) is True
+    assert entry[SVHC.flag] == "Yes"
+    assert entry["SVHC: Reason"] == "ED"
+    assert HITS_KEY not in entry
+
+
+def test_apply_match_joined():
+    entry = record("50-00-0")
+    apply_match(entry, svhc_index(), hits="joined")
+    assert entry["SVHC: Reason"] == "ED | CMR"
+    assert entry["SVHC: Date Inclusion"] == "2020-01-15 | -"
+
+
+def test_apply_match_long():
+    entry = record("50-00-0")
+    index = svhc_index()
+    apply_match(entry, index, hits="long")
+    assert entry["SVHC: Reason"] == "ED"
+    assert entry[HITS_KEY] == [("SVHC", 1, index.rows[0]), ("SVHC", 2, index.rows[1])]
+
+
+def test_apply_match_no_hit():
+    entry = record("7440-02-0")
+    assert apply_match(entry, svhc_index()) is False
+    assert entry[SVHC.flag] == "No"
+    assert "SVHC: Reason" not in entry
+
+
+def test_apply_match_on_partner_identifiers():
+    entry = record("-")
+    entry["Input"] = "-"
+    apply_match(entry, svhc_index(), identifiers=("200-001-8",))
+    assert entry["SVHC: Decision"] == "D1"
+
+
+def test_apply_match_prefixes_only_values():
+    spec = SOURCES_BY_NAME["food_flav"]
+    index = SourceIndex(spec, [{"Food flavourings: FL": "01.001"}, {"Food flavourings: FL": None}],
+                        [["64-17-5"], ["50-00-0"]])
+    filled, empty = record("64-17-5"), record("50-00-0")
+    apply_match(filled, index)
+    apply_match(empty, index)
+    assert filled["Food flavourings: FL"] == "FL 01.001"
+    assert empty["Food flavourings: FL"] is None